@@ -0,0 +1,140 @@
+"""Benchmark validated vs trusted serialization of stored documents.
+
+Builds documents shaped like the ones the API stores, then times encoding a
+1k-item list response both ways, per model:
+
+    validated: Model(**doc) -> jsonable_encoder -> JSONResponse
+    trusted:   TrustedEncoder.to_dict(doc) -> trusted_reads.dumps
+
+    python bench_serialization.py [--items 1000] [--repeat 20]
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import trusted_reads
+from models import ContactMessage, Order, ProductPublic, Testimonial
+from trusted_reads import TrustedEncoder, dumps
+
+
+def order_doc(i, now):
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "order_number": f"ORD-{i:013d}",
+        "customer_name": "Rajesh Kumar",
+        "customer_email": "reader@example.com",
+        "customer_phone": "+91 98765 43210",
+        "city": "Mumbai",
+        "items": [
+            {"product_id": "prod-1", "product_title": "Foundations of Software Design Volume 2",
+             "quantity": 1, "price": 999},
+            {"product_id": "prod-2", "product_title": "Software System Design", "quantity": 2, "price": 499},
+        ],
+        "subtotal": 1997,
+        "discount": 0,
+        "total": 1997,
+        "status": "completed",
+        "payment_status": "paid",
+        "razorpay_order_id": f"order_{i:014d}",
+        "razorpay_payment_id": f"pay_{i:014d}",
+        "created_at": now - timedelta(minutes=i),
+        "updated_at": now - timedelta(minutes=i),
+    }
+
+
+def contact_message_doc(i, now):
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "name": "Priya Sharma",
+        "email": "priya@example.com",
+        "subject": "Question about the bundle",
+        "message": "Is the second volume included in the bundle? " * 4,
+        "status": "new",
+        "created_at": now - timedelta(minutes=i),
+    }
+
+
+def product_doc(i, now):
+    return {
+        "_id": ObjectId(),
+        "id": f"prod-{i}",
+        "title": "Software Architecture Patterns",
+        "slug": f"software-architecture-patterns-{i}",
+        "image": "https://example.com/cover.webp",
+        "original_price": 1499,
+        "current_price": 499,
+        "description": "Practical architecture patterns for modern applications.",
+        "long_description": "Covers layered, event-driven, microkernel and microservice architectures. " * 3,
+        "features": ["300+ pages", "Case studies", "Lifetime updates"],
+        "created_at": now,
+    }
+
+
+def testimonial_doc(i, now):
+    return {
+        "_id": ObjectId(),
+        "id": i,
+        "name": "Amit Patel",
+        "position": "Senior Engineer",
+        "image": "https://example.com/amit.webp",
+        "text": "These books changed how I approach system design interviews.",
+        "is_active": True,
+        "created_at": now,
+    }
+
+
+CASES = [
+    ("orders", Order, order_doc),
+    ("contact_messages", ContactMessage, contact_message_doc),
+    ("products", ProductPublic, product_doc),
+    ("testimonials", Testimonial, testimonial_doc),
+]
+
+
+def validated(model, docs):
+    return JSONResponse([jsonable_encoder(model(**doc)) for doc in docs]).body
+
+
+def trusted(encoder, docs):
+    return dumps([encoder.to_dict(doc) for doc in docs])
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(items, repeat):
+    now = datetime.utcnow().replace(microsecond=123000)
+    print(f"{items} items per response, best of {repeat}, "
+          f"encoder: {'orjson' if trusted_reads.orjson else 'json'}")
+    print(f"{'route':<18}{'validated us/item':>20}{'trusted us/item':>18}{'speedup':>10}")
+    for name, model, make_doc in CASES:
+        docs = [make_doc(i, now) for i in range(items)]
+        encoder = TrustedEncoder(model)
+        # Both paths must produce the same response
+        if json.loads(validated(model, docs)) != json.loads(trusted(encoder, docs)):
+            raise SystemExit(f"{name}: trusted output differs from validated output")
+        before = best_of(lambda: validated(model, docs), repeat)
+        after = best_of(lambda: trusted(encoder, docs), repeat)
+        print(f"{name:<18}{before / items * 1e6:>20.2f}{after / items * 1e6:>18.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.items, args.repeat)
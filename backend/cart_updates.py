@@ -0,0 +1,121 @@
+"""Server-side cart updates.
+
+Each helper returns MongoDB update pipeline stages. Stages run atomically
+inside a single find_one_and_update on the cart document, so the items list
+is never read into Python and written back.
+"""
+import uuid
+from datetime import datetime
+
+
+class InvalidCartOperation(Exception):
+    """A batched cart operation that cannot be applied"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _literal(value):
+    # Client-supplied strings must never be read as field paths ("$...")
+    return {"$literal": value}
+
+
+def _items():
+    return {"$ifNull": ["$items", []]}
+
+
+def add_item_stage(product_id, quantity, price):
+    """Increment the item's quantity, or append it if it is not in the cart"""
+    product_id = _literal(product_id)
+    return {"$set": {"items": {"$cond": [
+        {"$in": [product_id, {"$map": {"input": _items(), "as": "item", "in": "$$item.product_id"}}]},
+        {"$map": {
+            "input": _items(),
+            "as": "item",
+            "in": {"$cond": [
+                {"$eq": ["$$item.product_id", product_id]},
+                {"$mergeObjects": ["$$item", {"quantity": {"$add": ["$$item.quantity", quantity]}}]},
+                "$$item"
+            ]}
+        }},
+        {"$concatArrays": [_items(), [{
+            "product_id": product_id,
+            "quantity": quantity,
+            "price_at_time": price
+        }]]}
+    ]}}}
+
+
+def set_quantity_stage(product_id, quantity):
+    """Set the item's quantity; a quantity of zero or less removes the item"""
+    if quantity <= 0:
+        return remove_item_stage(product_id)
+    return {"$set": {"items": {"$map": {
+        "input": _items(),
+        "as": "item",
+        "in": {"$cond": [
+            {"$eq": ["$$item.product_id", _literal(product_id)]},
+            {"$mergeObjects": ["$$item", {"quantity": quantity}]},
+            "$$item"
+        ]}
+    }}}}
+
+
+def remove_item_stage(product_id):
+    """Drop the item from the cart"""
+    return {"$set": {"items": {"$filter": {
+        "input": _items(),
+        "as": "item",
+        "cond": {"$ne": ["$$item.product_id", _literal(product_id)]}
+    }}}}
+
+
+def touch_stage():
+    """Bump updated_at and fill in the Cart defaults when the cart is new"""
+    now = datetime.utcnow()
+    return {"$set": {
+        "id": {"$ifNull": ["$id", str(uuid.uuid4())]},
+        "items": _items(),
+        "created_at": {"$ifNull": ["$created_at", now]},
+        "updated_at": now
+    }}
+
+
+def batch_update(operations, prices):
+    """Pipeline for an ordered list of add/update/remove operations.
+
+    ``prices`` maps the product id of every "add" to its current price.
+    Returns (stages, product ids that must already be in the cart, whether
+    the update may create the cart). Like PUT, updating an item that is not
+    in the cart is a 404: items updated before any operation in the batch
+    touched them must be in the stored cart, which the caller checks in its
+    query, and updating an item the batch removed is rejected here. Only a
+    batch that adds something may create the cart.
+    """
+    stages = []
+    # Whether each product is in the cart at this point of the batch, for
+    # products an earlier operation added or removed
+    in_cart = {}
+    required = []
+    for operation in operations:
+        if operation.op == "add":
+            if operation.quantity <= 0:
+                raise InvalidCartOperation(400, "Quantity to add must be positive")
+            stages.append(add_item_stage(operation.product_id, operation.quantity, prices[operation.product_id]))
+            in_cart[operation.product_id] = True
+        elif operation.op == "update":
+            if operation.product_id not in in_cart:
+                if operation.product_id not in required:
+                    required.append(operation.product_id)
+            elif not in_cart[operation.product_id]:
+                raise InvalidCartOperation(404, "Item not found in cart")
+            stages.append(set_quantity_stage(operation.product_id, operation.quantity))
+            in_cart[operation.product_id] = operation.quantity > 0
+        else:
+            stages.append(remove_item_stage(operation.product_id))
+            in_cart[operation.product_id] = False
+    stages.append(touch_stage())
+    upsert = not required and any(operation.op == "add" for operation in operations)
+    return stages, required, upsert
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+class EmailOutbox:
+    """Durable email queue stored in MongoDB and drained by background workers.
+
+    Request handlers call ``enqueue()`` and return immediately. Workers claim
+    one job at a time, call the handler registered for the job's kind and
+    retry failures with exponential backoff. A claimed job is leased until
+    ``lock_timeout`` seconds have passed, so jobs held by a crashed worker are
+    picked up again.
+    """
+
+    def __init__(self, collection, handlers, workers=2, max_attempts=8,
+                 base_delay=5, max_delay=3600, poll_interval=5, lock_timeout=300):
+        self.collection = collection
+        self.handlers = handlers
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    async def enqueue(self, kind, payload, dedupe_key=None):
+        """Store an email job; jobs with the same dedupe_key are only stored once"""
+        now = datetime.utcnow()
+        job_id = dedupe_key or str(uuid.uuid4())
+        await self.collection.update_one(
+            {"id": job_id},
+            {"$setOnInsert": {
+                "id": job_id,
+                "kind": kind,
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "last_error": "",
+                "next_attempt_at": now,
+                "created_at": now,
+                "updated_at": now
+            }},
+            upsert=True
+        )
+        self._wakeup.set()
+        return job_id
+
+    def start(self):
+        self._stopping = False
+        for number in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(number)))
+        logger.info(f"Email outbox started with {self.workers} workers")
+
+    async def stop(self):
+        # wait_for can swallow a cancel that races with the wakeup event, so
+        # workers also check this flag
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, number):
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Email outbox worker {number} failed to claim a job: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(job)
+            except Exception as e:
+                # The lease expires and another attempt picks the job up
+                logger.error(f"Email outbox worker {number} failed on job {job['id']}: {str(e)}")
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            # "sending" jobs whose lease has expired belonged to a worker that died
+            {"status": {"$in": ["pending", "sending"]}, "next_attempt_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": "sending",
+                    "next_attempt_at": now + timedelta(seconds=self.lock_timeout),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _process(self, job):
+        try:
+            handler = self.handlers[job['kind']]
+            sent = await handler(job['payload'])
+            if sent is False:
+                raise RuntimeError("handler reported the email was not sent")
+        except Exception as e:
+            await self._retry_later(job, str(e))
+            return
+
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"id": job['id']},
+            {"$set": {"status": "sent", "sent_at": now, "updated_at": now}}
+        )
+        logger.info(f"Email outbox job {job['id']} sent")
+
+    async def _retry_later(self, job, error):
+        now = datetime.utcnow()
+        if job['attempts'] >= self.max_attempts:
+            update = {"status": "failed", "last_error": error, "updated_at": now}
+            logger.error(f"Email outbox job {job['id']} failed permanently: {error}")
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (job['attempts'] - 1))
+            delay *= random.uniform(0.8, 1.2)
+            update = {
+                "status": "pending",
+                "last_error": error,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "updated_at": now
+            }
+            logger.warning(f"Email outbox job {job['id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+        await self.collection.update_one({"id": job['id']}, {"$set": update})
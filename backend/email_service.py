@@ -1,18 +1,109 @@
 import os
+import asyncio
+import time
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
 from email_template import get_order_email_html
+from metrics import SMTP_SEND_DURATION, observe_duration
 
 logger = logging.getLogger(__name__)
 
+class SMTPConnectionPool:
+    """Pool of authenticated SMTP sessions reused across sends.
+
+    Opening a session costs a TCP connect, a TLS handshake and an AUTH round
+    trip, so up to ``size`` sessions are kept open. Sessions idle for longer
+    than ``health_check_after`` seconds are checked with NOOP before reuse, and
+    dead sessions are replaced transparently.
+    """
+
+    def __init__(self, size=2, health_check_after=30, timeout=30):
+        self.size = size
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self._idle = []  # (client, last_used) pairs, most recently used last
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self):
+        # Connect over SSL from the start (SMTP_USE_TLS=false for a local sink);
+        # connect() logs in when credentials are set
+        client = aiosmtplib.SMTP(
+            hostname=os.environ.get('SMTP_HOST', 'smtp.hostinger.com'),
+            port=int(os.environ.get('SMTP_PORT', 465)),
+            username=os.environ.get('SMTP_USER'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            use_tls=os.environ.get('SMTP_USE_TLS', 'true').lower() != 'false',
+            start_tls=False,
+            timeout=self.timeout
+        )
+        await client.connect()
+        return client
+
+    async def _acquire(self):
+        while self._idle:
+            client, last_used = self._idle.pop()
+            if not client.is_connected:
+                continue
+            if time.monotonic() - last_used < self.health_check_after:
+                return client
+            try:
+                await client.noop()
+                return client
+            except aiosmtplib.SMTPException:
+                client.close()
+        return await self._connect()
+
+    async def send(self, message):
+        """Send a message over a pooled session, reconnecting once if it dropped"""
+        with observe_duration(SMTP_SEND_DURATION):
+            await self._send(message)
+
+    async def _send(self, message):
+        async with self._slots:
+            client = await self._acquire()
+            try:
+                await client.send_message(message)
+            except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+                client.close()
+                client = await self._connect()
+                try:
+                    await client.send_message(message)
+                except Exception:
+                    client.close()
+                    raise
+            except Exception:
+                client.close()
+                raise
+            self._idle.append((client, time.monotonic()))
+
+    async def close(self):
+        while self._idle:
+            client, _ = self._idle.pop()
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+
+_smtp_pool = None
+
+def get_smtp_pool():
+    """Return the shared SMTP pool, creating it on first use"""
+    global _smtp_pool
+    if _smtp_pool is None:
+        _smtp_pool = SMTPConnectionPool(size=int(os.environ.get('SMTP_POOL_SIZE', 2)))
+    return _smtp_pool
+
+async def close_smtp_pool():
+    """Close pooled SMTP sessions (call on application shutdown)"""
+    if _smtp_pool is not None:
+        await _smtp_pool.close()
+
 async def send_contact_form_email(contact_data):
     """Send contact form notification email to sell@bookblaze.org"""
     try:
         # Get SMTP settings from environment
-        smtp_host = os.environ.get('SMTP_HOST', 'smtp.hostinger.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', 465))
         smtp_user = os.environ.get('SMTP_USER')
         smtp_password = os.environ.get('SMTP_PASSWORD')
         from_email = os.environ.get('SMTP_FROM_EMAIL')
@@ -88,16 +179,8 @@ async def send_contact_form_email(contact_data):
         html_part = MIMEText(html_content, 'html')
         message.attach(html_part)
         
-        # Send email using aiosmtplib with SSL
-        await aiosmtplib.send(
-            message,
-            hostname=smtp_host,
-            port=smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            use_tls=True,
-            start_tls=False  # Use SSL from the start
-        )
+        # Send email over a pooled SSL session
+        await get_smtp_pool().send(message)
         
         logger.info(f"Contact form email sent to {to_email} from {contact_data['email']}")
         return True
@@ -110,8 +193,6 @@ async def send_order_confirmation_email(order_data):
     """Send order confirmation email via Hostinger SMTP"""
     try:
         # Get SMTP settings from environment
-        smtp_host = os.environ.get('SMTP_HOST', 'smtp.hostinger.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', 465))
         smtp_user = os.environ.get('SMTP_USER')
         smtp_password = os.environ.get('SMTP_PASSWORD')
         from_email = os.environ.get('SMTP_FROM_EMAIL')
@@ -138,16 +219,8 @@ async def send_order_confirmation_email(order_data):
         html_part = MIMEText(html_content, 'html')
         message.attach(html_part)
         
-        # Send email using aiosmtplib with SSL
-        await aiosmtplib.send(
-            message,
-            hostname=smtp_host,
-            port=smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            use_tls=True,
-            start_tls=False  # Use SSL from the start
-        )
+        # Send email over a pooled SSL session
+        await get_smtp_pool().send(message)
         
         logger.info(f"Order confirmation email sent to {to_email} for order {order_data['order_number']}")
         return True
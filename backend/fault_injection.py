@@ -0,0 +1,199 @@
+"""Latency and fault injection for local tuning.
+
+A FaultProfile describes how a dependency misbehaves: a latency
+distribution, an error rate and a stall rate. Profiles are written as
+comma-separated settings, e.g.
+
+    latency=lognormal:20:0.8,errors=0.01,stall=0.001,stall_seconds=30
+
+Settings:
+
+    latency=50              fixed 50 ms
+    latency=10-80           uniform between 10 and 80 ms
+    latency=exp:20          exponential with a 20 ms mean
+    latency=lognormal:20:0.8  log-normal with a 20 ms median and sigma 0.8
+    errors=0.01             fraction of calls that fail
+    stall=0.001             fraction of calls that hang for stall_seconds
+    stall_seconds=30        how long a stall lasts (default 30)
+    seed=42                 make the sequence of faults reproducible
+
+The stand-ins in stubs.py take a profile for Razorpay and SMTP. For MongoDB,
+set MONGO_FAULTS to a profile and server.py wraps its database in
+FaultyDatabase.
+"""
+import asyncio
+import math
+import random
+
+from pymongo.errors import AutoReconnect
+
+
+class InjectedFault(Exception):
+    """Raised for a call the profile decided should fail"""
+
+
+class LatencyDistribution:
+    """Samples delays in seconds"""
+
+    def __init__(self, kind, *params):
+        self.kind = kind
+        self.params = params
+
+    @classmethod
+    def parse(cls, spec):
+        kind, _, rest = spec.partition(":")
+        if kind == "exp":
+            return cls("exp", float(rest) / 1000)
+        if kind == "lognormal":
+            median, sigma = rest.split(":")
+            return cls("lognormal", float(median) / 1000, float(sigma))
+        if "-" in spec:
+            low, high = spec.split("-")
+            return cls("uniform", float(low) / 1000, float(high) / 1000)
+        return cls("fixed", float(spec) / 1000)
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "exp":
+            return rng.expovariate(1 / self.params[0])
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class FaultProfile:
+    """Latency, errors and stalls to inject into calls to one dependency"""
+
+    def __init__(self, latency=None, error_rate=0.0, stall_rate=0.0, stall_seconds=30.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec):
+        """Build a profile from "latency=...,errors=...,stall=..." (see module docs)"""
+        options = {}
+        for setting in filter(None, (part.strip() for part in (spec or "").split(","))):
+            key, _, value = setting.partition("=")
+            if key == "latency":
+                options["latency"] = LatencyDistribution.parse(value)
+            elif key == "errors":
+                options["error_rate"] = float(value)
+            elif key == "stall":
+                options["stall_rate"] = float(value)
+            elif key == "stall_seconds":
+                options["stall_seconds"] = float(value)
+            elif key == "seed":
+                options["seed"] = int(value)
+            else:
+                raise ValueError(f"Unknown fault setting: {key}")
+        return cls(**options)
+
+    def next_fault(self):
+        """Decide the next call's fate: (delay in seconds, whether it fails)"""
+        delay = self.latency.sample(self.rng) if self.latency else 0.0
+        if self.stall_rate and self.rng.random() < self.stall_rate:
+            delay += self.stall_seconds
+        return delay, bool(self.error_rate) and self.rng.random() < self.error_rate
+
+    async def inject(self):
+        """Sleep for the sampled delay, then raise InjectedFault if the call fails"""
+        delay, fails = self.next_fault()
+        if delay:
+            await asyncio.sleep(delay)
+        if fails:
+            raise InjectedFault("Injected fault")
+
+
+# ==================== MOTOR WRAPPER ====================
+
+# Collection methods that make one round trip to the server
+FAULTY_COLLECTION_METHODS = {
+    "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "count_documents", "estimated_document_count",
+    "distinct", "bulk_write",
+}
+
+
+async def _inject_mongo(profile):
+    try:
+        await profile.inject()
+    except InjectedFault:
+        # What a dropped connection or failover looks like to the driver's caller
+        raise AutoReconnect("Injected fault")
+
+
+class FaultyCursor:
+    """Wraps a Motor cursor; the fault is injected when results are fetched"""
+
+    def __init__(self, cursor, profile):
+        self._cursor = cursor
+        self._profile = profile
+        self._started = False
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # sort(), limit(), batch_size() and friends return the cursor
+            return self if result is self._cursor else result
+        return chained
+
+    async def to_list(self, length=None):
+        await _inject_mongo(self._profile)
+        return await self._cursor.to_list(length)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._started:
+            self._started = True
+            await _inject_mongo(self._profile)
+        return await self._cursor.__anext__()
+
+
+class FaultyCollection:
+    """Wraps a Motor collection, injecting faults into its server calls"""
+
+    def __init__(self, collection, profile):
+        self._collection = collection
+        self._profile = profile
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name in ("find", "aggregate"):
+            return lambda *args, **kwargs: FaultyCursor(attribute(*args, **kwargs), self._profile)
+        if name not in FAULTY_COLLECTION_METHODS:
+            return attribute
+
+        async def call(*args, **kwargs):
+            await _inject_mongo(self._profile)
+            return await attribute(*args, **kwargs)
+        return call
+
+
+class FaultyDatabase:
+    """Wraps a Motor database so every collection injects faults"""
+
+    def __init__(self, database, profile):
+        self._database = database
+        self._profile = profile
+
+    def __getitem__(self, name):
+        return FaultyCollection(self._database[name], self._profile)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._database, name)
+        # Only collections are wrapped; db.command() and friends pass through
+        if name.startswith("_") or not hasattr(attribute, "find_one"):
+            return attribute
+        return FaultyCollection(attribute, self._profile)
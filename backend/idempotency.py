@@ -0,0 +1,168 @@
+import functools
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """The key is already in use by a request that cannot be replayed"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def request_fingerprint(payload):
+    """Hash of a request model, used to detect a key reused for another request"""
+    return hashlib.sha256(payload.json().encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Stored responses for requests sent with an Idempotency-Key header.
+
+    Keys live in a MongoDB collection (expired by a TTL index on created_at)
+    with a small in-memory LRU in front, so a replay usually costs no round
+    trip. A key is claimed before the request runs; a second request with the
+    same key gets the stored response, or 409 while the first is in flight.
+    """
+
+    def __init__(self, collection, ttl=86400, lock_timeout=60, cache_size=1000):
+        self.collection = collection
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    async def begin(self, scope, key, fingerprint):
+        """Claim the key. Returns the stored response if the request already completed."""
+        doc_id = f"{scope}:{key}"
+        cached = self._cached(doc_id)
+        if cached is not None:
+            self._check_fingerprint(cached, fingerprint)
+            return cached['response']
+
+        now = datetime.utcnow()
+        try:
+            await self.collection.insert_one({
+                "_id": doc_id,
+                "fingerprint": fingerprint,
+                "status": "in_progress",
+                "created_at": now,
+                "locked_until": now + timedelta(seconds=self.lock_timeout)
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+
+        existing = await self.collection.find_one({"_id": doc_id})
+        if existing is None:
+            # Expired between our insert and read; let the client retry
+            raise IdempotencyConflict(409, "Request with this Idempotency-Key is in progress")
+        self._check_fingerprint(existing, fingerprint)
+        if existing['status'] == "completed":
+            self._remember(doc_id, existing)
+            return existing['response']
+
+        # Take over a claim left behind by a request that never finished
+        taken = await self.collection.find_one_and_update(
+            {"_id": doc_id, "status": "in_progress", "locked_until": {"$lt": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=self.lock_timeout)}},
+            return_document=ReturnDocument.AFTER
+        )
+        if taken is None:
+            raise IdempotencyConflict(409, "Request with this Idempotency-Key is in progress")
+        return None
+
+    async def complete(self, scope, key, status_code, body):
+        """Store the response for replays"""
+        doc_id = f"{scope}:{key}"
+        response = {"status_code": status_code, "body": body}
+        doc = await self.collection.find_one_and_update(
+            {"_id": doc_id},
+            {"$set": {"status": "completed", "response": response}},
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            self._remember(doc_id, doc)
+
+    async def release(self, scope, key):
+        """Forget a claim whose request failed, so the client can retry it"""
+        await self.collection.delete_one({"_id": f"{scope}:{key}", "status": "in_progress"})
+
+    def _check_fingerprint(self, doc, fingerprint):
+        if doc['fingerprint'] != fingerprint:
+            raise IdempotencyConflict(422, "Idempotency-Key was already used with a different request")
+
+    def _cached(self, doc_id):
+        entry = self._cache.get(doc_id)
+        if entry is None:
+            return None
+        doc, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._cache[doc_id]
+            return None
+        self._cache.move_to_end(doc_id)
+        return doc
+
+    def _remember(self, doc_id, doc):
+        # Cached no longer than the TTL index keeps the document
+        age = (datetime.utcnow() - doc['created_at']).total_seconds()
+        self._cache[doc_id] = (doc, time.monotonic() + max(0, self.ttl - age))
+        self._cache.move_to_end(doc_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def idempotent(store, scope):
+    """Route decorator adding Idempotency-Key support.
+
+    The route must declare an ``idempotency_key`` header parameter and one
+    request body model. Without the header the route runs as usual. With it,
+    the first successful response is stored and returned for every retry.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            key = kwargs.get('idempotency_key')
+            if not key:
+                return await handler(*args, **kwargs)
+
+            payload = next(value for value in kwargs.values() if isinstance(value, BaseModel))
+            try:
+                stored = await store.begin(scope, key, request_fingerprint(payload))
+            except IdempotencyConflict as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            if stored is not None:
+                return JSONResponse(
+                    stored['body'],
+                    status_code=stored['status_code'],
+                    headers={"Idempotent-Replayed": "true"}
+                )
+
+            try:
+                result = await handler(*args, **kwargs)
+            except Exception:
+                await store.release(scope, key)
+                raise
+            body = jsonable_encoder(result)
+            try:
+                await store.complete(scope, key, 200, body)
+            except Exception as e:
+                # The request succeeded; the client must get its response even
+                # though a retry with this key can no longer be replayed
+                logger.error(f"Error storing response for Idempotency-Key {scope}:{key}: {str(e)}")
+            return body
+        return wrapper
+    return decorator
@@ -0,0 +1,249 @@
+"""MongoDB index management.
+
+Indexes are created at application startup, one at a time so that a
+unique index blocked by duplicate documents does not stop the others. Run
+this module directly to create them (it exits non-zero if any index could
+not be built, listing the duplicate keys) and check that every query shape
+the API issues is served by an index:
+
+    python indexes.py --check
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Carts untouched for this long are removed by MongoDB's TTL monitor
+DEFAULT_CART_TTL_SECONDS = 30 * 24 * 3600
+
+# Stored Idempotency-Key responses are removed after this long
+DEFAULT_IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+
+# Returned by createIndexes when an index exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+
+# Returned by createIndexes when existing documents violate a unique index
+DUPLICATE_KEY = 11000
+
+# How many duplicated keys to report when a unique index cannot be built
+MAX_REPORTED_DUPLICATES = 5
+
+# Case-insensitive matching for customer emails; queries must pass the same collation
+EMAIL_COLLATION = {"locale": "en", "strength": 2}
+
+# Indexes for every collection, keyed by collection name
+INDEXES = {
+    "products": [
+        IndexModel([("slug", ASCENDING)], name="slug_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "carts": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+    ],
+    "orders": [
+        IndexModel([("order_number", ASCENDING)], name="order_number_unique", unique=True),
+        IndexModel(
+            [("customer_email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="customer_email_ci_created_at",
+            collation=EMAIL_COLLATION,
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("payment_status", ASCENDING), ("created_at", DESCENDING)],
+            name="status_payment_status_created_at",
+        ),
+        # Only paid orders whose confirmation email is not queued yet carry the field
+        IndexModel(
+            [("confirmation_pending", ASCENDING), ("updated_at", ASCENDING)],
+            name="confirmation_pending_updated_at",
+            sparse=True,
+        ),
+    ],
+    "contact_messages": [
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="status_created_at_id",
+        ),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "email_outbox": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+    ],
+    "testimonials": [
+        IndexModel([("is_active", ASCENDING)], name="is_active"),
+    ],
+}
+
+# Every query shape the API issues: (collection, filter, sort, collation).
+# Not listed on purpose: the full catalog load (db.products.find()) reads the
+# whole collection by design.
+QUERY_SHAPES = [
+    ("products", {"slug": "example-slug"}, None, None),
+    ("products", {"id": "prod-1"}, None, None),
+    ("products", {"id": {"$in": ["prod-1", "prod-2"]}}, None, None),
+    ("carts", {"session_id": "session-example"}, None, None),
+    ("orders", {"order_number": "ORD-EXAMPLE"}, None, None),
+    ("orders", {"customer_email": "Reader@Example.com"}, [("created_at", DESCENDING), ("_id", DESCENDING)],
+     EMAIL_COLLATION),
+    ("orders", {"status": "completed", "payment_status": "paid"}, [("created_at", DESCENDING)], None),
+    ("orders", {"confirmation_pending": True, "updated_at": {"$lt": datetime.utcnow()}}, None, None),
+    ("contact_messages", {}, [("created_at", DESCENDING), ("_id", DESCENDING)], None),
+    ("contact_messages", {"status": "new"}, [("created_at", DESCENDING), ("_id", DESCENDING)], None),
+    ("contact_messages", {"id": "message-1"}, None, None),
+    ("testimonials", {"is_active": True}, None, None),
+    ("email_outbox", {"status": {"$in": ["pending", "sending"]}, "next_attempt_at": {"$lte": datetime.utcnow()}},
+     [("next_attempt_at", ASCENDING)], None),
+]
+
+
+async def ensure_ttl_index(db, collection, field, name, expire_after_seconds):
+    """Create a TTL index, or update its expiry if it already exists"""
+    try:
+        await db[collection].create_index(
+            [(field, ASCENDING)], name=name, expireAfterSeconds=expire_after_seconds
+        )
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await db.command(
+            "collMod", collection,
+            index={"name": name, "expireAfterSeconds": expire_after_seconds}
+        )
+
+
+async def find_duplicates(collection, index):
+    """Key values held by more than one document, which block a unique index"""
+    spec = index.document
+    group = {field.replace(".", "_"): f"${field}" for field in spec["key"]}
+    pipeline = [
+        {"$group": {"_id": group, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": MAX_REPORTED_DUPLICATES},
+    ]
+    options = {"collation": spec["collation"]} if "collation" in spec else {}
+    return [row async for row in collection.aggregate(pipeline, allowDiskUse=True, **options)]
+
+
+async def create_index(db, collection, index):
+    """Create one index. Returns None, or a description of why it failed."""
+    name = index.document["name"]
+    try:
+        # One index per call: a failing unique index must not stop the others
+        await db[collection].create_indexes([index])
+        return None
+    except OperationFailure as e:
+        if e.code != DUPLICATE_KEY:
+            return f"{collection}.{name}: {str(e)}"
+        duplicates = await find_duplicates(db[collection], index)
+        listed = ", ".join(f"{row['_id']} x{row['count']}" for row in duplicates)
+        return f"{collection}.{name}: duplicate keys must be removed first ({listed})"
+    except PyMongoError as e:
+        return f"{collection}.{name}: {str(e)}"
+
+
+async def ensure_indexes(db, cart_ttl_seconds=DEFAULT_CART_TTL_SECONDS,
+                         idempotency_ttl_seconds=DEFAULT_IDEMPOTENCY_TTL_SECONDS):
+    """Create all indexes and return the ones that failed.
+
+    Failures are logged so the API can still start; ``python indexes.py``
+    exits non-zero on them.
+    """
+    failures = []
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            failure = await create_index(db, collection, index)
+            if failure:
+                logger.error(f"Error creating index {failure}")
+                failures.append(failure)
+    ttl_indexes = [
+        ("carts", "updated_at", cart_ttl_seconds),
+        ("idempotency_keys", "created_at", idempotency_ttl_seconds),
+    ]
+    for collection, field, expire_after_seconds in ttl_indexes:
+        try:
+            await ensure_ttl_index(db, collection, field, f"{field}_ttl", expire_after_seconds)
+        except PyMongoError as e:
+            logger.error(f"Error creating TTL index on {collection}: {str(e)}")
+            failures.append(f"{collection}.{field}_ttl: {str(e)}")
+    if failures:
+        logger.error(f"{len(failures)} MongoDB indexes are missing; unique constraints are not enforced")
+    else:
+        logger.info("MongoDB indexes ensured")
+    return failures
+
+
+def _find_stages(plan, stage):
+    """Recursively collect plan nodes whose stage matches"""
+    found = []
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            found.append(plan)
+        for value in plan.values():
+            found.extend(_find_stages(value, stage))
+    elif isinstance(plan, list):
+        for value in plan:
+            found.extend(_find_stages(value, stage))
+    return found
+
+
+async def check_query_plans(db):
+    """Explain every known query shape; return a list of shapes that COLLSCAN"""
+    failures = []
+    for collection, query, sort, collation in QUERY_SHAPES:
+        cursor = db[collection].find(query, collation=collation)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        if _find_stages(winning_plan, "COLLSCAN"):
+            failures.append((collection, query, sort, collation))
+    return failures
+
+
+async def main(check):
+    ROOT_DIR = Path(__file__).parent
+    load_dotenv(ROOT_DIR / '.env')
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        index_failures = await ensure_indexes(
+            db,
+            int(os.environ.get('CART_TTL_SECONDS', DEFAULT_CART_TTL_SECONDS)),
+            int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', DEFAULT_IDEMPOTENCY_TTL_SECONDS))
+        )
+        for failure in index_failures:
+            print(f"MISSING INDEX: {failure}")
+        if not check:
+            return 1 if index_failures else 0
+
+        failures = await check_query_plans(db)
+        for collection, query, sort, collation in failures:
+            print(f"COLLSCAN: {collection}.find({query}) sort={sort} collation={collation}")
+        if failures:
+            print(f"{len(failures)} of {len(QUERY_SHAPES)} query shapes are not indexed")
+        else:
+            print(f"All {len(QUERY_SHAPES)} query shapes use an index")
+        return 1 if failures or index_failures else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Create MongoDB indexes")
+    parser.add_argument("--check", action="store_true",
+                        help="explain every query shape and fail on any COLLSCAN")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.check)))
@@ -0,0 +1,350 @@
+"""Offline load test for the API.
+
+Runs the app against a local mongod, with Razorpay and SMTP replaced by the
+stand-ins in stubs.py, and drives concurrent scenarios:
+
+    browse    catalog, product page, testimonials and the home bundle
+    cart      add, update, read, remove and clear cart items
+    checkout  fill a cart, POST /checkout, verify the payment
+    recent    poll the recent-purchases popup
+
+Latency and throughput are reported per endpoint (route template) as JSON.
+The database named by --db-name is dropped and re-seeded first.
+
+In-process mode calls the ASGI app directly (no sockets), so it measures the
+app's own cost; the load generator shares its event loop. Uvicorn mode runs
+the app in separate worker processes, like production.
+
+    python loadtest.py --duration 30 --concurrency 8 --output results.json
+    python loadtest.py --mode uvicorn --workers 2
+    python loadtest.py --compare baseline.json --tolerance 0.25
+
+With --compare the run fails (exit 1) when an endpoint's p95 grew, or its
+throughput fell, by more than the tolerance.
+
+Slow or failing dependencies can be simulated with fault profiles (see
+fault_injection.py):
+
+    python loadtest.py --mongo-faults "latency=exp:5" \
+        --razorpay-faults "latency=lognormal:300:0.7,stall=0.01,stall_seconds=15"
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from fault_injection import FaultProfile
+from stubs import RazorpayStub, SMTPSink, free_port
+
+ROOT_DIR = Path(__file__).parent
+
+RAZORPAY_KEY_ID = "rzp_test_loadtest"
+RAZORPAY_KEY_SECRET = "loadtest_secret"
+
+
+class Recorder:
+    """Latency samples per endpoint"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, client, method, template, expected=(200,), **kwargs):
+        """Issue a request; ``template`` names the endpoint in the report"""
+        path = template.format(**kwargs.pop("path_params", {}))
+        name = f"{method} {template.split('?')[0]}"
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            ok = response.status_code in expected
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.samples.setdefault(name, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response if ok else None
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_samples[max(0, math.ceil(fraction * len(sorted_samples)) - 1)]
+
+
+def summarize(samples, errors, elapsed):
+    ordered = sorted(samples)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+# ==================== SCENARIOS ====================
+
+async def browse(client, recorder, catalog):
+    await recorder.call(client, "GET", "/api/products")
+    slug = random.choice(catalog)["slug"]
+    await recorder.call(client, "GET", "/api/products/{slug}", path_params={"slug": slug})
+    await recorder.call(client, "GET", "/api/testimonials")
+    await recorder.call(client, "GET", "/api/home", params={"session_id": f"loadtest-{uuid.uuid4()}"})
+
+
+async def cart(client, recorder, catalog):
+    session = {"session_id": f"loadtest-{uuid.uuid4()}"}
+    first, second = random.sample(catalog, 2) if len(catalog) > 1 else (catalog[0], catalog[0])
+    for product in (first, second):
+        await recorder.call(client, "POST", "/api/cart/{session_id}/items", path_params=session,
+                            json={"product_id": product["id"], "quantity": 1})
+    await recorder.call(client, "PUT", "/api/cart/{session_id}/items/{product_id}",
+                        path_params={**session, "product_id": first["id"]}, json={"quantity": 3})
+    await recorder.call(client, "GET", "/api/cart/{session_id}", path_params=session)
+    await recorder.call(client, "DELETE", "/api/cart/{session_id}/items/{product_id}",
+                        path_params={**session, "product_id": second["id"]})
+    await recorder.call(client, "DELETE", "/api/cart/{session_id}", path_params=session)
+
+
+async def checkout(client, recorder, catalog):
+    session = {"session_id": f"loadtest-{uuid.uuid4()}"}
+    product = random.choice(catalog)
+    await recorder.call(client, "POST", "/api/cart/{session_id}/items", path_params=session,
+                        json={"product_id": product["id"], "quantity": 1})
+    response = await recorder.call(client, "POST", "/api/checkout", json={
+        **session,
+        "customer_name": "Load Test",
+        "customer_email": "loadtest@example.com",
+        "city": "Mumbai"
+    })
+    if response is None:
+        return
+    checkout_session = response.json()
+    order_id = checkout_session["razorpay_order_id"]
+    payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+    signature = hmac.new(
+        RAZORPAY_KEY_SECRET.encode(), f"{order_id}|{payment_id}".encode(), hashlib.sha256
+    ).hexdigest()
+    await recorder.call(client, "POST", "/api/razorpay/verify-payment", json={
+        "razorpay_order_id": order_id,
+        "razorpay_payment_id": payment_id,
+        "razorpay_signature": signature,
+        "order_number": checkout_session["order"]["order_number"]
+    })
+
+
+async def recent(client, recorder, catalog):
+    await recorder.call(client, "GET", "/api/orders/recent-purchases")
+
+
+SCENARIOS = {
+    "browse": browse,
+    "cart": cart,
+    "checkout": checkout,
+    "recent": recent,
+}
+
+
+async def run_scenarios(client, scenarios, concurrency, duration, think_time, catalog):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    async def user(scenario):
+        while time.monotonic() < deadline:
+            await scenario(client, recorder, catalog)
+            # Always yield: in-process, a request served from memory never
+            # suspends, and one user would starve the others
+            await asyncio.sleep(think_time)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        user(SCENARIOS[name]) for name in scenarios for _ in range(concurrency)
+    ))
+    return recorder, time.perf_counter() - start
+
+
+# ==================== SETUP ====================
+
+async def prepare_database(mongo_url, db_name):
+    """Drop and seed the load-test database; returns the product list"""
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=3000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as e:
+        raise SystemExit(f"Cannot reach MongoDB at {mongo_url}: {str(e)}")
+    import seed_db
+
+    await client.drop_database(db_name)
+    db = client[db_name]
+    await db.products.insert_many([dict(product) for product in seed_db.products_data])
+    await db.testimonials.insert_many([dict(testimonial) for testimonial in seed_db.testimonials_data])
+    products = await db.products.find({}, {"_id": 0, "id": 1, "slug": 1}).to_list(None)
+    client.close()
+    return products
+
+
+def configure_environment(args, razorpay, smtp):
+    os.environ.update({
+        "MONGO_URL": args.mongo_url,
+        "DB_NAME": args.db_name,
+        "RAZORPAY_KEY_ID": RAZORPAY_KEY_ID,
+        "RAZORPAY_KEY_SECRET": RAZORPAY_KEY_SECRET,
+        "RAZORPAY_API_BASE": razorpay.base_url,
+        "SMTP_HOST": smtp.host,
+        "SMTP_PORT": str(smtp.port),
+        "SMTP_USE_TLS": "false",
+        "SMTP_USER": "loadtest",
+        "SMTP_PASSWORD": "loadtest",
+        "SMTP_FROM_EMAIL": "loadtest@example.com",
+        "MONGO_FAULTS": args.mongo_faults,
+    })
+
+
+async def wait_until_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/products")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("API did not become ready")
+
+
+async def main(args):
+    razorpay = RazorpayStub(faults=FaultProfile.parse(args.razorpay_faults))
+    smtp = SMTPSink(faults=FaultProfile.parse(args.smtp_faults))
+    await razorpay.start()
+    smtp.start()
+    configure_environment(args, razorpay, smtp)
+    catalog = await prepare_database(args.mongo_url, args.db_name)
+
+    server_process = None
+    app = None
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.mode == "inprocess":
+        import server
+
+        app = server.app
+        await app.router.startup()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest",
+                                   limits=limits, timeout=30)
+    else:
+        port = free_port()
+        server_process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=ROOT_DIR
+        )
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30)
+
+    try:
+        await wait_until_ready(client)
+        if args.warmup:
+            await run_scenarios(client, args.scenarios, args.concurrency, args.warmup, args.think_time, catalog)
+        recorder, elapsed = await run_scenarios(
+            client, args.scenarios, args.concurrency, args.duration, args.think_time, catalog
+        )
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+        await razorpay.stop()
+        smtp.stop()
+
+    all_samples = [sample for samples in recorder.samples.values() for sample in samples]
+    return {
+        "config": {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "scenarios": args.scenarios,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "think_time_s": args.think_time,
+            "faults": {
+                "mongo": args.mongo_faults,
+                "razorpay": args.razorpay_faults,
+                "smtp": args.smtp_faults,
+            },
+        },
+        "elapsed_s": round(elapsed, 3),
+        "total": summarize(all_samples, sum(recorder.errors.values()), elapsed),
+        "endpoints": {
+            name: summarize(samples, recorder.errors.get(name, 0), elapsed)
+            for name, samples in sorted(recorder.samples.items())
+        },
+        "stubs": {"razorpay_orders": razorpay.orders_created, "emails": smtp.received},
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """Endpoints whose p95 or throughput moved past the tolerance"""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test for the API")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="bookblaze_loadtest")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda value: [name for name in value.split(",") if name])
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent users per scenario")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds to run before measuring")
+    parser.add_argument("--think-time", type=float, default=0, help="seconds each user waits between iterations")
+    parser.add_argument("--mongo-faults", default="", help="fault profile for MongoDB calls")
+    parser.add_argument("--razorpay-faults", default="", help="fault profile for the Razorpay stand-in")
+    parser.add_argument("--smtp-faults", default="", help="fault profile for the SMTP sink")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = asyncio.run(main(args))
+    report = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+    if args.compare:
+        regressions = find_regressions(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
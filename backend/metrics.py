@@ -0,0 +1,151 @@
+"""Prometheus metrics.
+
+Request latency and in-flight requests per route (MetricsMiddleware), MongoDB
+command durations per collection and command (MongoCommandMetrics, a pymongo
+CommandListener), and latency of the SMTP and Razorpay calls, which the
+email and gateway modules record with ``observe_duration``.
+
+With several worker processes, set PROMETHEUS_MULTIPROC_DIR so /api/metrics
+aggregates every worker. Gauges are kept with inc()/dec() rather than
+set_function(), which multiprocess mode never writes to its files.
+
+/api/metrics requires METRICS_TOKEN as a bearer token when it is set;
+otherwise it is public and should be blocked at the proxy.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from pymongo import monitoring
+from starlette.routing import Match
+
+# Sub-millisecond buckets for calls that are usually fast
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served, by route template",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency by collection and command",
+    ["collection", "command", "outcome"],
+    buckets=FAST_BUCKETS,
+)
+SMTP_SEND_DURATION = Histogram(
+    "smtp_send_duration_seconds",
+    "Time to send one email through the SMTP pool, including waiting for a connection",
+    ["outcome"],
+)
+RAZORPAY_REQUEST_DURATION = Histogram(
+    "razorpay_request_duration_seconds",
+    "Razorpay API call latency",
+    ["method", "path", "outcome"],
+)
+SSE_SUBSCRIBERS = Gauge(
+    "recent_purchases_stream_subscribers",
+    "Open recent-purchases SSE streams",
+    multiprocess_mode="livesum",
+)
+
+
+@contextmanager
+def observe_duration(histogram, **labels):
+    """Time the block and record it with outcome="success" or "error\""""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Records every command's duration; pass to the client's event_listeners"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event):
+        self._record(event, "success")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(
+            collection=collection, command=event.command_name, outcome=outcome
+        ).observe(event.duration_micros / 1e6)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request.
+
+    Requests are labelled with the matched route template (/api/orders/{order_number}),
+    never the raw path, so label cardinality stays bounded. Streaming
+    responses count as in progress until the stream ends.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method=method, route=route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(method=method, route=route, status=status).observe(
+                time.perf_counter() - start
+            )
+            in_progress.dec()
+
+    def _route_template(self, scope):
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+        return "unmatched"
+
+
+def metrics_payload():
+    """(body, content type) of the current metrics in the Prometheus text format"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
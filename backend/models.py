@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import List, Optional, Literal
 from datetime import datetime
 import uuid
 
@@ -60,6 +60,12 @@ class Cart(BaseModel):
     class Config:
         from_attributes = True
 
+class CartSummary(BaseModel):
+    session_id: str
+    items: List[CartItem] = []
+    item_count: int = 0
+    subtotal: int = 0
+
 class CartItemAdd(BaseModel):
     product_id: str
     quantity: int = 1
@@ -67,6 +73,14 @@ class CartItemAdd(BaseModel):
 class CartItemUpdate(BaseModel):
     quantity: int
 
+class CartOperation(BaseModel):
+    op: Literal["add", "update", "remove"]
+    product_id: str
+    quantity: int = 1  # Added amount for "add", new quantity for "update"
+
+class CartOperations(BaseModel):
+    operations: List[CartOperation]
+
 # Order Models
 class OrderItem(BaseModel):
     product_id: str
@@ -122,6 +136,14 @@ class PaymentVerification(BaseModel):
     razorpay_signature: str
     order_number: str
 
+# Checkout Models
+class CheckoutSession(BaseModel):
+    order: Order
+    razorpay_order_id: str
+    amount: int  # Amount in paise (INR)
+    currency: str
+    key_id: str  # Razorpay key id for the checkout widget
+
 # Contact Models
 class ContactMessageCreate(BaseModel):
     name: str
@@ -137,6 +159,9 @@ class ContactMessage(ContactMessageCreate):
     class Config:
         from_attributes = True
 
+class ContactMessageStatusUpdate(BaseModel):
+    status: Literal["new", "handled"]
+
 # Testimonial Models
 class TestimonialBase(BaseModel):
     name: str
@@ -151,3 +176,16 @@ class Testimonial(TestimonialBase):
 
     class Config:
         from_attributes = True
+
+# Home Page Models
+class RecentPurchase(BaseModel):
+    customerName: str
+    productName: str
+    timeAgo: str
+    location: str
+
+class HomePage(BaseModel):
+    products: List[ProductPublic]
+    testimonials: List[Testimonial]
+    cart: Optional[CartSummary] = None
+    recent_purchases: List[RecentPurchase]
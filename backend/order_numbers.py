@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Custom epoch (2024-01-01 UTC) so 41 bits of milliseconds last until 2093
+EPOCH_MS = 1704067200000
+
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Crockford base32: no I, L, O or U, so numbers are easy to read out loud
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ENCODED_LENGTH = 13  # 13 * 5 bits covers the 63-bit id
+
+
+def configured_worker_id():
+    """Worker id from ORDER_WORKER_ID, or None when unset.
+
+    Only for deployments that give every process its own environment; under
+    ``uvicorn --workers N`` all workers would share the id, so leave it unset
+    and let each process lease one (WorkerIdLease).
+    """
+    value = os.environ.get('ORDER_WORKER_ID')
+    if not value:
+        return None
+    worker_id = int(value)
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError(f"ORDER_WORKER_ID must be between 0 and {MAX_WORKER_ID}, got {worker_id}")
+    return worker_id
+
+
+def encode(value):
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class OrderNumberGenerator:
+    """Snowflake-style order numbers: timestamp, worker id, sequence.
+
+    Numbers are unique without a database check and sort by creation time,
+    both numerically and as fixed-width strings.
+    """
+
+    def __init__(self, worker_id=None, prefix="ORD-"):
+        self.worker_id = None
+        self.prefix = prefix
+        self._valid_until = None
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+        if worker_id is not None:
+            self.assign(worker_id)
+
+    def assign(self, worker_id, valid_until=None):
+        """Use ``worker_id`` from now on, until the monotonic time ``valid_until`` if given"""
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        with self._lock:
+            self.worker_id = worker_id
+            self._valid_until = valid_until
+
+    def next(self):
+        with self._lock:
+            if self.worker_id is None:
+                raise RuntimeError("No order number worker id assigned")
+            if self._valid_until is not None and time.monotonic() >= self._valid_until:
+                # Another process may own the id by now
+                raise RuntimeError(f"Order number worker id {self.worker_id} lease expired")
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms <= self._last_ms:
+                # Same millisecond, or the clock went backwards: stay on the last
+                # timestamp and borrow the next millisecond once the sequence runs out
+                now_ms = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    now_ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            value = (now_ms << (WORKER_ID_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+        return self.prefix + encode(value)
+
+
+class WorkerIdLease:
+    """Leases a worker id from MongoDB so every process gets its own.
+
+    Each id in 0-1023 is a document in ``collection``. A process claims a
+    free or expired one at startup and renews it every ``ttl / 3`` seconds;
+    the generator stops issuing numbers if renewals fail for ``ttl / 2``
+    seconds, well before another process could take the id over. A lost
+    lease is replaced by a fresh one.
+    """
+
+    def __init__(self, collection, generator, ttl=60):
+        self.collection = collection
+        self.generator = generator
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.worker_id = None
+        self._task = None
+
+    async def start(self):
+        await self._acquire()
+        self._task = asyncio.create_task(self._renew_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.worker_id is not None:
+            await self.collection.delete_one({"_id": self.worker_id, "owner": self.owner})
+
+    async def _acquire(self):
+        # Start at a random id so processes starting together rarely contend
+        start = random.randrange(MAX_WORKER_ID + 1)
+        for offset in range(MAX_WORKER_ID + 1):
+            worker_id = (start + offset) % (MAX_WORKER_ID + 1)
+            valid_until = time.monotonic() + self.ttl / 2
+            now = datetime.utcnow()
+            try:
+                # Matches an expired lease; otherwise the upsert collides with the live one
+                await self.collection.update_one(
+                    {"_id": worker_id, "expires_at": {"$lt": now}},
+                    {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                continue
+            self.worker_id = worker_id
+            self.generator.assign(worker_id, valid_until)
+            logger.info(f"Leased order number worker id {worker_id}")
+            return
+        raise RuntimeError("No free order number worker id")
+
+    async def _renew(self):
+        valid_until = time.monotonic() + self.ttl / 2
+        now = datetime.utcnow()
+        result = await self.collection.update_one(
+            {"_id": self.worker_id, "owner": self.owner},
+            {"$set": {"expires_at": now + timedelta(seconds=self.ttl)}}
+        )
+        if result.matched_count:
+            self.generator.assign(self.worker_id, valid_until)
+        else:
+            logger.warning(f"Lost the lease on order number worker id {self.worker_id}; leasing another")
+            await self._acquire()
+
+    async def _renew_forever(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await self._renew()
+            except Exception as e:
+                logger.error(f"Error renewing order number worker id lease: {str(e)}")
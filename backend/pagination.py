@@ -0,0 +1,42 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class InvalidCursor(ValueError):
+    """The cursor query parameter could not be decoded"""
+
+
+def encode_cursor(doc, sort_field="created_at"):
+    """Opaque cursor pointing just after ``doc`` in (sort_field, _id) descending order"""
+    raw = json.dumps({"t": doc[sort_field].isoformat(), "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (sort value, ObjectId) for a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(raw["t"]), ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidCursor("Invalid cursor")
+
+
+def keyset_filter(query, cursor, sort_field="created_at"):
+    """Add the "after this cursor" condition to a query sorted by (sort_field, _id) descending"""
+    if not cursor:
+        return query
+    value, object_id = decode_cursor(cursor)
+    after = {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "_id": {"$lt": object_id}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+
+def keyset_sort(sort_field="created_at"):
+    return [(sort_field, -1), ("_id", -1)]
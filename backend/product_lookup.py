@@ -0,0 +1,45 @@
+import time
+
+
+class ProductLookup:
+    """Full product documents by id, including download links.
+
+    Used by checkout and payment code that needs private fields the public
+    catalog snapshot does not hold. Documents are cached for ``ttl`` seconds;
+    all misses for a call are fetched with a single query.
+    """
+
+    def __init__(self, fetch_many, ttl, max_entries=1000):
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+
+    async def get_many(self, product_ids):
+        """Return a dict of product id -> product document for the ids that exist"""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        for product_id in dict.fromkeys(product_ids):
+            entry = self._entries.get(product_id)
+            if entry is not None and entry[1] > now:
+                found[product_id] = entry[0]
+            else:
+                missing.append(product_id)
+
+        if missing:
+            expires_at = now + self.ttl
+            for product in await self.fetch_many(missing):
+                self._store(product['id'], product, expires_at)
+                found[product['id']] = product
+        return found
+
+    def invalidate(self):
+        self._entries.clear()
+
+    def _store(self, product_id, product, expires_at):
+        self._entries.pop(product_id, None)
+        if len(self._entries) >= self.max_entries:
+            # Entries are kept in insertion order, so the first one is the oldest
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[product_id] = (product, expires_at)
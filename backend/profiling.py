@@ -0,0 +1,112 @@
+"""Opt-in per-request profiling.
+
+A request is profiled when it carries a valid X-Profile-Token header, or is
+picked by the PROFILE_SAMPLE_RATE sample. The profile is written to
+PROFILE_DIR (oldest files are removed beyond PROFILE_MAX_FILES) and its file
+name is returned in the X-Profile-Id response header.
+
+Profiles are taken with pyinstrument, a sampling profiler that follows await
+points, and written as an HTML flame view. When neither a secret nor a sample rate is configured the
+middleware passes requests straight through.
+
+Mint a token for the next 10 minutes:
+
+    python profiling.py --ttl 600
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import random
+import time
+import uuid
+from pathlib import Path
+
+from pyinstrument import Profiler
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = b"x-profile-token"
+ID_HEADER = b"x-profile-id"
+
+
+def sign_token(secret, expires_at):
+    """Token "<expiry>.<hmac>" valid until the epoch second ``expires_at``"""
+    signature = hmac.new(secret.encode(), str(expires_at).encode(), hashlib.sha256).hexdigest()
+    return f"{expires_at}.{signature}"
+
+
+def verify_token(secret, token):
+    expires_at, _, signature = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    expected = sign_token(secret, int(expires_at)).partition(".")[2]
+    return hmac.compare_digest(signature, expected)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected requests to a bounded directory"""
+
+    def __init__(self, app, secret="", sample_rate=0.0, directory="/tmp/profiles", max_files=50):
+        self.app = app
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.enabled = bool(secret) or sample_rate > 0
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.html"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            try:
+                await asyncio.to_thread(self._save, profiler, profile_id, scope)
+            except Exception as e:
+                logger.error(f"Error saving profile {profile_id}: {str(e)}")
+
+    def _selected(self, scope):
+        if self.secret:
+            for name, value in scope["headers"]:
+                if name == TOKEN_HEADER:
+                    return verify_token(self.secret, value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _save(self, profiler, profile_id, scope):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / profile_id
+        path.write_text(profiler.output_html(), encoding="utf-8")
+        logger.info(f"Profiled {scope['method']} {scope['path']} -> {path}")
+
+        # Keep only the newest max_files profiles
+        profiles = sorted(self.directory.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in profiles[self.max_files:]:
+            old.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    parser = argparse.ArgumentParser(description="Mint an X-Profile-Token header value")
+    parser.add_argument("--ttl", type=int, default=600, help="seconds the token stays valid")
+    args = parser.parse_args()
+    secret = os.environ.get('PROFILE_SECRET', '')
+    if not secret:
+        raise SystemExit("PROFILE_SECRET is not set")
+    print(sign_token(secret, int(time.time()) + args.ttl))
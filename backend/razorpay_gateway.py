@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from metrics import RAZORPAY_REQUEST_DURATION, observe_duration
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """Razorpay call failed or was rejected"""
+
+    def __init__(self, message, status_code=502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(GatewayError):
+    """Razorpay calls are short-circuited after repeated failures"""
+
+    def __init__(self, message="Payment gateway temporarily unavailable"):
+        super().__init__(message, status_code=503)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls fail fast. After ``reset_timeout`` seconds one trial call
+    is let through; its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+
+    def allow(self):
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Razorpay circuit opened")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class RazorpayGateway:
+    """Async Razorpay REST client.
+
+    Uses a keep-alive connection pool, a timeout on every call, a cap on
+    concurrent calls and a circuit breaker, so a slow gateway never blocks
+    the event loop or piles up requests. ``base_url`` can point at a local
+    stub server for testing.
+    """
+
+    def __init__(self, key_id, key_secret, base_url="https://api.razorpay.com/v1",
+                 timeout=10.0, max_connections=20, max_concurrency=20, breaker=None):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.key_id, self.key_secret),
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+        return self._client
+
+    async def create_order(self, order_data):
+        """Create a Razorpay order (same contract as razorpay_client.order.create)"""
+        return await self._request("POST", "/orders", json=order_data)
+
+    async def _request(self, method, path, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError()
+        try:
+            return await self._call(method, path, **kwargs)
+        except GatewayError:
+            raise
+        except BaseException:
+            # Cancelled (shutdown, a caller's timeout) or failed unexpectedly before
+            # an outcome was recorded. A half-open trial must still end, or no
+            # call would ever be allowed again.
+            self.breaker.record_failure()
+            raise
+
+    async def _call(self, method, path, **kwargs):
+        """Make the call, recording its outcome unless it is interrupted"""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Every slot is held by a slow call, which also counts against the gateway
+            self.breaker.record_failure()
+            raise GatewayError("Payment gateway is busy", status_code=503)
+
+        try:
+            with observe_duration(RAZORPAY_REQUEST_DURATION, method=method, path=path):
+                response = await self._get_client().request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise GatewayError(f"Razorpay request failed: {type(e).__name__}: {str(e)}")
+        finally:
+            self._slots.release()
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            raise GatewayError(f"Razorpay returned {response.status_code}")
+
+        # A 4xx means the gateway is healthy but rejected the request
+        self.breaker.record_success()
+        if response.status_code >= 400:
+            try:
+                description = response.json()['error']['description']
+            except (ValueError, KeyError, TypeError):
+                description = response.text
+            raise GatewayError(f"Razorpay rejected the request: {description}", status_code=400)
+        return response.json()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+# Shown when there are fewer real purchases than the buffer holds
+MOCK_PURCHASES = [
+    { "customerName": "Rajesh K.", "productName": "Software System Design", "timeAgo": "2 hours ago", "location": "Mumbai, India" },
+    { "customerName": "Priya S.", "productName": "Software Architecture Patterns", "timeAgo": "3 hours ago", "location": "Bangalore, India" },
+    { "customerName": "Amit P.", "productName": "Foundations of Software Design Volume 2", "timeAgo": "4 hours ago", "location": "Delhi, India" },
+]
+
+
+def format_time_ago(seconds):
+    """Render an age in seconds as "N minutes/hours/days ago\""""
+    if seconds < 3600:  # Less than 1 hour
+        minutes = int(seconds / 60)
+        return f"{minutes} minutes ago" if minutes > 1 else "1 minute ago"
+    elif seconds < 86400:  # Less than 1 day
+        hours = int(seconds / 3600)
+        return f"{hours} hours ago" if hours > 1 else "1 hour ago"
+    days = int(seconds / 86400)
+    return f"{days} days ago" if days > 1 else "1 day ago"
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+def to_timestamp(created_at):
+    """Epoch seconds for a stored created_at (naive UTC datetime or ISO string)"""
+    if not created_at:
+        return None
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+class RecentPurchases:
+    """Ring buffer of the latest paid orders for the purchase popup.
+
+    Seeded from MongoDB and appended to as payments are verified, so reads
+    never touch the database. Rendered lists are cached for
+    ``render_interval`` seconds, which bounds how stale "time ago" can be.
+
+    New purchases are also pushed to subscribers (the SSE stream). Each
+    event is encoded once and the same bytes are queued for every
+    subscriber; a subscriber whose queue is full misses that event.
+    """
+
+    def __init__(self, size=40, render_interval=30, subscriber_queue_size=16):
+        self.size = size
+        self.render_interval = render_interval
+        self.subscriber_queue_size = subscriber_queue_size
+        self._entries = []  # Newest first
+        self._version = 0
+        self._rendered = None
+        self._rendered_key = None
+        self._subscribers = set()
+        self._seeded = False
+
+    def seed(self, orders):
+        """Replace the buffer with orders (any order; newest are kept).
+
+        After the first seed, purchases that were not buffered before are
+        published, so payments verified by other workers reach this worker's
+        subscribers.
+        """
+        previous = {entry['order_number'] for entry in self._entries}
+        self._entries = []
+        for order in orders:
+            self._insert(order)
+        self._version += 1
+
+        if self._seeded:
+            for entry in reversed(self._entries):
+                if entry['order_number'] not in previous:
+                    self._publish(entry)
+        self._seeded = True
+
+    def record(self, order):
+        """Add a newly paid order; returns the entry, or None if it was not added"""
+        entry = self._insert(order)
+        if entry is not None:
+            self._version += 1
+            self._publish(entry)
+        return entry
+
+    def subscribe(self):
+        """Register a subscriber; returns the queue its events arrive on"""
+        queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, entry):
+        if not self._subscribers:
+            return
+        message = sse_event("purchase", self.render_entry(entry))
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                pass
+
+    def snapshot(self):
+        """The popup payload: latest purchases padded with mock data"""
+        now = time.time()
+        key = (self._version, int(now // self.render_interval))
+        if self._rendered_key != key:
+            self._rendered = self._render(now)
+            self._rendered_key = key
+        return self._rendered
+
+    def _insert(self, order):
+        # Orders without items have nothing to show
+        if not order.get('items'):
+            return None
+        order_number = order.get('order_number')
+        if order_number and any(entry['order_number'] == order_number for entry in self._entries):
+            return None
+
+        entry = {
+            "order_number": order_number,
+            "customerName": order.get('customer_name', 'Anonymous'),
+            "productName": order['items'][0].get('product_title', 'Product'),
+            "location": order.get('city', 'India'),
+            "created_at": to_timestamp(order.get('created_at'))
+        }
+        # Keep newest first by creation time, like the original sorted query
+        position = 0
+        sort_key = entry['created_at'] or 0
+        while position < len(self._entries) and (self._entries[position]['created_at'] or 0) > sort_key:
+            position += 1
+        if position >= self.size:
+            return None
+        self._entries.insert(position, entry)
+        del self._entries[self.size:]
+        return entry
+
+    def render_entry(self, entry, now=None):
+        now = time.time() if now is None else now
+        if entry['created_at'] is None:
+            time_ago = "recently"
+        else:
+            time_ago = format_time_ago(now - entry['created_at'])
+        return {
+            "customerName": entry['customerName'],
+            "productName": entry['productName'],
+            "timeAgo": time_ago,
+            "location": entry['location']
+        }
+
+    def _render(self, now):
+        purchases = [self.render_entry(entry, now) for entry in self._entries]
+        # If less than the buffer size, pad with mock data
+        if len(purchases) < self.size:
+            purchases.extend(MOCK_PURCHASES[:self.size - len(purchases)])
+        return purchases
@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import json
+
+import brotli
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+# Used when a route does not configure its own Cache-Control header
+DEFAULT_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=600"
+
+
+def serialize_json(payload):
+    """Encode a payload exactly like FastAPI's default JSONResponse"""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def parse_accept_encoding(header):
+    """Return the set of encodings the client accepts (q > 0)"""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def parse_if_none_match(header):
+    """Return the opaque entity tags listed in an If-None-Match header"""
+    tags = set()
+    for tag in (header or "").split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag:
+            tags.add(tag)
+    return tags
+
+
+class CachedBody:
+    """A serialized JSON body with its pre-compressed variants"""
+
+    def __init__(self, identity):
+        self.identity = identity
+        # Derived from the content, so every worker computes the same tag
+        self.digest = hashlib.sha256(identity).hexdigest()[:32]
+        self.variants = {}
+        if len(identity) >= MIN_COMPRESS_SIZE:
+            gzipped = gzip.compress(identity, compresslevel=9, mtime=0)
+            if len(gzipped) < len(identity):
+                self.variants["gzip"] = gzipped
+            compressed = brotli.compress(identity, quality=11)
+            if len(compressed) < len(identity):
+                self.variants["br"] = compressed
+
+    def encoding_for(self, accept_encoding):
+        """The smallest variant the client accepts, or None for identity"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    def content(self, encoding):
+        return self.variants[encoding] if encoding else self.identity
+
+    def select(self, accept_encoding):
+        """Pick the smallest variant the client accepts: (encoding, body)"""
+        encoding = self.encoding_for(accept_encoding)
+        return encoding, self.content(encoding)
+
+    def etag(self, encoding=None):
+        """Strong ETag for the given representation"""
+        if encoding:
+            return f'"{self.digest}-{encoding}"'
+        return f'"{self.digest}"'
+
+    def matches(self, if_none_match):
+        """True if If-None-Match names any representation of this body"""
+        tags = parse_if_none_match(if_none_match)
+        if "*" in tags:
+            return True
+        return any(tag.strip('"').split("-")[0] == self.digest for tag in tags)
+
+
+class ComposedBody(CachedBody):
+    """A JSON object assembled per request from already serialized members.
+
+    ``members`` maps each key to a CachedBody, whose bytes and digest are
+    reused as they are, or to a payload serialized for this request. The
+    body is only compressed when sent, in the one encoding the client picked,
+    at cheaper levels than long-lived cached bodies.
+    """
+
+    def __init__(self, members):
+        chunks = []
+        digest = hashlib.sha256()
+        for key, member in members.items():
+            name = json.dumps(key).encode("utf-8")
+            digest.update(name)
+            if isinstance(member, CachedBody):
+                serialized = member.identity
+                digest.update(member.digest.encode())
+            else:
+                serialized = serialize_json(member)
+                digest.update(serialized)
+            chunks.append(name + b":" + serialized)
+        self.identity = b"{" + b",".join(chunks) + b"}"
+        self.digest = digest.hexdigest()[:32]
+        self.variants = {}
+
+    def encoding_for(self, accept_encoding):
+        if len(self.identity) < MIN_COMPRESS_SIZE:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        if "br" in accepted or "*" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def content(self, encoding):
+        if encoding == "br":
+            return brotli.compress(self.identity, quality=5)
+        if encoding == "gzip":
+            return gzip.compress(self.identity, compresslevel=6, mtime=0)
+        return self.identity
+
+
+class ResponseCache:
+    """Serialized response bodies keyed by name and data version.
+
+    A body is built the first time a key is requested for a given version and
+    reused until the version changes.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get_body(self, key, version, build_payload):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        body = CachedBody(serialize_json(build_payload()))
+        self._entries[key] = (version, body)
+        return body
+
+
+def cached_json_response(request, body, cache_control=DEFAULT_CACHE_CONTROL):
+    """Build a response for a cached body.
+
+    Honours Accept-Encoding and answers If-None-Match with an empty 304.
+    """
+    encoding = body.encoding_for(request.headers.get("accept-encoding"))
+    headers = {
+        "Vary": "Accept-Encoding",
+        "ETag": body.etag(encoding),
+        "Cache-Control": cache_control,
+    }
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body.content(encoding), media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache()
@@ -1,9 +1,33 @@
+"""Seed the database.
+
+    python seed_db.py
+
+inserts the real catalog and testimonials. Generator mode bulk-loads
+synthetic, production-shaped data for index and query benchmarks:
+
+    python seed_db.py --generate --products 10000 --orders 5000000 \
+        --carts 2000000 --contact-messages 500000 --seed 42 --drop
+
+Documents are built batch by batch from ``seed`` (each batch has its own
+random stream), so the same arguments always produce the same data, and
+batches are written with parallel ``insert_many(ordered=False)`` calls.
+"""
+import argparse
 import asyncio
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from indexes import ensure_indexes
+from order_numbers import EPOCH_MS, WORKER_ID_BITS, SEQUENCE_BITS, encode
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -137,6 +161,226 @@ async def seed_database():
     
     print("Database seeding completed successfully!")
 
+# ==================== GENERATOR MODE ====================
+
+FIRST_NAMES = ["Aarav", "Priya", "Rahul", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rohan", "Isha",
+               "Aditya", "Meera", "Karan", "Divya", "Siddharth", "Pooja", "Nikhil", "Riya", "Varun", "Neha"]
+LAST_NAMES = ["Sharma", "Patel", "Verma", "Gupta", "Singh", "Reddy", "Iyer", "Nair", "Mehta", "Joshi",
+              "Kumar", "Rao", "Malhotra", "Chopra", "Bose", "Das", "Menon", "Pillai", "Kapoor", "Yadav"]
+CITIES = [("Mumbai", "Maharashtra"), ("Bangalore", "Karnataka"), ("Delhi", "Delhi"), ("Hyderabad", "Telangana"),
+          ("Chennai", "Tamil Nadu"), ("Pune", "Maharashtra"), ("Kolkata", "West Bengal"), ("Ahmedabad", "Gujarat"),
+          ("Jaipur", "Rajasthan"), ("Kochi", "Kerala")]
+TOPICS = ["System Design", "Distributed Systems", "Software Architecture", "Clean Code", "Microservices",
+          "Data Engineering", "Cloud Patterns", "Algorithms", "DevOps", "Machine Learning Systems"]
+SUBJECTS = ["Question about the bundle", "Download link not working", "Invoice request", "Bulk purchase",
+            "Feedback", "Refund request", "Payment failed but money deducted"]
+
+# Orders are spread over this many days before the generation time
+ORDER_HISTORY_DAYS = 730
+
+# Generated carts stay inside the cart TTL so the TTL monitor keeps them
+CART_AGE_DAYS = 25
+
+# How many items an order or cart holds, and how often
+ITEM_COUNTS = [1, 2, 3, 4]
+ITEM_COUNT_WEIGHTS = [70, 20, 7, 3]
+
+
+def skewed_index(rng, size, skew=2.0):
+    """Index in [0, size) where low indexes are much more likely (popular items, repeat customers)"""
+    return min(size - 1, int(size * rng.random() ** skew))
+
+
+def generate_product(rng, i, now):
+    topic = TOPICS[i % len(TOPICS)]
+    original_price = rng.choice([999, 1499, 1999, 2499, 2999])
+    return {
+        "id": f"gen-prod-{i:06d}",
+        "title": f"{topic} Handbook Vol. {i // len(TOPICS) + 1}",
+        "slug": f"{topic.lower().replace(' ', '-')}-handbook-{i}",
+        "image": f"https://example.com/covers/{i}.webp",
+        "original_price": original_price,
+        "current_price": rng.choice([9, 49, 99, 199, 299, 499]),
+        "description": f"A practical guide to {topic.lower()}.",
+        "long_description": f"Everything a working engineer needs to know about {topic.lower()}. " * 4,
+        "features": rng.sample(["Case studies", "Interview questions", "Diagrams", "Exercises",
+                                "Lifetime updates", "Cheat sheets", "Real-world examples"], 4),
+        "download_link": "",
+        "pdf_link": "",
+        "created_at": now - timedelta(days=rng.randint(0, ORDER_HISTORY_DAYS)),
+        "updated_at": now
+    }
+
+
+def generate_items(rng, catalog):
+    items = []
+    chosen = set()
+    for _ in range(rng.choices(ITEM_COUNTS, ITEM_COUNT_WEIGHTS)[0]):
+        product = catalog[skewed_index(rng, len(catalog))]
+        if product["id"] in chosen:
+            continue
+        chosen.add(product["id"])
+        items.append({"product": product, "quantity": 1 if rng.random() < 0.95 else 2})
+    return items
+
+
+def generate_order(rng, i, now, catalog, customers):
+    # Spread orders evenly over the history window; each one gets its own
+    # millisecond, which keeps order numbers unique
+    span_ms = ORDER_HISTORY_DAYS * 86400 * 1000
+    step_ms = span_ms / customers["orders"]
+    created_ms = int(now.timestamp() * 1000 - span_ms + i * step_ms + rng.random() * max(step_ms - 1, 0))
+    created_at = datetime.utcfromtimestamp(created_ms / 1000)
+    order_number = "ORD-" + encode((created_ms - EPOCH_MS) << (WORKER_ID_BITS + SEQUENCE_BITS) | (i & 0xFFF))
+
+    customer = skewed_index(rng, customers["count"])
+    first, last = FIRST_NAMES[customer % len(FIRST_NAMES)], LAST_NAMES[customer // len(FIRST_NAMES) % len(LAST_NAMES)]
+    email = f"{first}.{last}{customer}@example.com".lower()
+    # Some customers type their address with capitals; lookups are case-insensitive
+    if rng.random() < 0.1:
+        email = email.capitalize()
+    city, state = CITIES[customer % len(CITIES)]
+
+    items = generate_items(rng, catalog)
+    subtotal = sum(item["product"]["current_price"] * item["quantity"] for item in items)
+    original = sum(item["product"]["original_price"] * item["quantity"] for item in items)
+    paid = rng.random() < 0.65
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "order_number": order_number,
+        "customer_email": email,
+        "customer_name": f"{first} {last}",
+        "customer_phone": f"+91 9{rng.randint(100000000, 999999999)}",
+        "billing_address": f"{rng.randint(1, 999)}, {rng.choice(LAST_NAMES)} Street",
+        "city": city,
+        "state": state,
+        "pincode": str(rng.randint(110001, 855126)),
+        "items": [
+            {
+                "product_id": item["product"]["id"],
+                "product_title": item["product"]["title"],
+                "quantity": item["quantity"],
+                "price": item["product"]["current_price"]
+            }
+            for item in items
+        ],
+        "subtotal": subtotal,
+        "discount": original - subtotal,
+        "total": subtotal,
+        "status": "completed" if paid else "pending",
+        "payment_status": "paid" if paid else "pending",
+        "razorpay_order_id": f"order_{rng.getrandbits(56):014x}",
+        "razorpay_payment_id": f"pay_{rng.getrandbits(56):014x}" if paid else "",
+        "razorpay_signature": f"{rng.getrandbits(256):064x}" if paid else "",
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(minutes=rng.randint(1, 10)) if paid else created_at
+    }
+
+
+def generate_cart(rng, i, now, catalog):
+    created_at = now - timedelta(seconds=rng.randint(0, CART_AGE_DAYS * 86400))
+    # A fifth of carts were emptied again
+    items = [] if rng.random() < 0.2 else [
+        {"product_id": item["product"]["id"], "quantity": item["quantity"],
+         "price_at_time": item["product"]["current_price"]}
+        for item in generate_items(rng, catalog)
+    ]
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "session_id": f"session-gen-{i:08d}",
+        "items": items,
+        "created_at": created_at,
+        "updated_at": created_at + timedelta(seconds=rng.randint(0, 3600))
+    }
+
+
+def generate_contact_message(rng, i, now):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    created_at = now - timedelta(seconds=rng.randint(0, ORDER_HISTORY_DAYS * 86400))
+    # Older messages have usually been handled
+    handled = rng.random() < min(0.95, (now - created_at).days / 30)
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "name": f"{first} {last}",
+        "email": f"{first.lower()}.{last.lower()}{rng.randint(1, 9999)}@example.com",
+        "subject": rng.choice(SUBJECTS),
+        "message": "Hi, I have a question about my purchase. " * rng.randint(1, 6),
+        "status": "handled" if handled else "new",
+        "created_at": created_at
+    }
+
+
+async def bulk_load(collection, total, make_document, seed, batch_size, parallel):
+    """Insert ``total`` generated documents with parallel unordered insert_many batches"""
+    if total <= 0:
+        return
+    slots = asyncio.Semaphore(parallel)
+    inserted = 0
+    duplicates = 0
+    started = time.monotonic()
+
+    async def load_batch(batch):
+        nonlocal inserted, duplicates
+        async with slots:
+            rng = random.Random(f"{seed}:{collection.name}:{batch}")
+            first = batch * batch_size
+            documents = [make_document(rng, i) for i in range(first, min(first + batch_size, total))]
+            try:
+                result = await collection.insert_many(documents, ordered=False)
+                inserted += len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Documents already present from an earlier run are skipped
+                inserted += e.details['nInserted']
+                duplicates += len(e.details['writeErrors'])
+            elapsed = time.monotonic() - started
+            print(f"\r{collection.name}: {inserted + duplicates:,}/{total:,} "
+                  f"({(inserted + duplicates) / elapsed:,.0f} docs/s)", end="", file=sys.stderr, flush=True)
+
+    await asyncio.gather(*(load_batch(batch) for batch in range((total + batch_size - 1) // batch_size)))
+    print(file=sys.stderr)
+    print(f"Inserted {inserted:,} {collection.name} in {time.monotonic() - started:.1f}s"
+          + (f" ({duplicates:,} already present)" if duplicates else ""))
+
+
+async def generate_database(args):
+    print(f"Generating data with seed {args.seed}...")
+    # Truncated to the day so reruns on the same day produce identical documents
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if args.drop:
+        for name in ("products", "orders", "carts", "contact_messages"):
+            await db[name].drop()
+        print("Dropped existing products, orders, carts and contact messages")
+    await ensure_indexes(db)
+
+    rng = random.Random(f"{args.seed}:catalog")
+    catalog = [generate_product(rng, i, now) for i in range(args.products)] or products_data
+    await bulk_load(db.products, args.products, lambda rng, i: catalog[i], args.seed,
+                    args.batch_size, args.parallel)
+
+    customers = {"count": max(1, args.orders // 3), "orders": max(1, args.orders)}
+    await bulk_load(db.orders, args.orders, lambda rng, i: generate_order(rng, i, now, catalog, customers),
+                    args.seed, args.batch_size, args.parallel)
+    await bulk_load(db.carts, args.carts, lambda rng, i: generate_cart(rng, i, now, catalog),
+                    args.seed, args.batch_size, args.parallel)
+    await bulk_load(db.contact_messages, args.contact_messages,
+                    lambda rng, i: generate_contact_message(rng, i, now),
+                    args.seed, args.batch_size, args.parallel)
+    # The inbox counts are rebuilt from the collection on the next read
+    await db.counters.delete_one({"_id": "contact_messages"})
+    print("Data generation completed successfully!")
+
 if __name__ == "__main__":
-    asyncio.run(seed_database())
+    parser = argparse.ArgumentParser(description="Seed the database")
+    parser.add_argument("--generate", action="store_true", help="bulk-load synthetic data instead")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--carts", type=int, default=50000)
+    parser.add_argument("--contact-messages", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--parallel", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--drop", action="store_true", help="drop the generated collections first")
+    args = parser.parse_args()
+
+    asyncio.run(generate_database(args) if args.generate else seed_database())
     client.close()
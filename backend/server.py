@@ -1,38 +1,71 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Header, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 import os
+import asyncio
 import logging
 from pathlib import Path
-from typing import List
-from datetime import datetime
-import random
-import string
-import razorpay
+from typing import List, Optional
+from datetime import datetime, timedelta
 import hmac
 import hashlib
 
 from models import (
     Product, ProductCreate, ProductPublic,
-    Cart, CartItemAdd, CartItemUpdate,
+    Cart, CartItem, CartItemAdd, CartItemUpdate, CartOperations, CartSummary,
     Order, OrderCreate, OrderItem,
-    ContactMessage, ContactMessageCreate,
-    Testimonial,
-    RazorpayOrderCreate, PaymentVerification
+    ContactMessage, ContactMessageCreate, ContactMessageStatusUpdate,
+    Testimonial, HomePage,
+    RazorpayOrderCreate, PaymentVerification, CheckoutSession
 )
-from email_service import send_order_confirmation_email, send_contact_form_email
+from email_service import send_order_confirmation_email, send_contact_form_email, close_smtp_pool
+from snapshot_cache import SnapshotCache
+from indexes import ensure_indexes, DEFAULT_CART_TTL_SECONDS, DEFAULT_IDEMPOTENCY_TTL_SECONDS, EMAIL_COLLATION
+from pagination import encode_cursor, keyset_filter, keyset_sort, InvalidCursor
+from status_counts import StatusCounts
+from trusted_reads import TrustedEncoder, dumps, trusted_json_response
+from metrics import MetricsMiddleware, MongoCommandMetrics, SSE_SUBSCRIBERS, metrics_payload
+from profiling import ProfilingMiddleware
+from fault_injection import FaultyDatabase, FaultProfile
+from product_lookup import ProductLookup
+from email_outbox import EmailOutbox
+from razorpay_gateway import RazorpayGateway, CircuitBreaker, GatewayError
+from idempotency import IdempotencyStore, idempotent
+from order_numbers import OrderNumberGenerator, WorkerIdLease, configured_worker_id
+from recent_purchases import RecentPurchases, sse_event
+from cart_updates import add_item_stage, batch_update, InvalidCartOperation, touch_stage
+from response_cache import response_cache, cached_json_response, ComposedBody, DEFAULT_CACHE_CONTROL
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
-# Initialize Razorpay client
-razorpay_client = razorpay.Client(auth=(os.environ['RAZORPAY_KEY_ID'], os.environ['RAZORPAY_KEY_SECRET']))
+# Local tuning only: inject latency, errors and stalls into every MongoDB call
+if os.environ.get('MONGO_FAULTS'):
+    db = FaultyDatabase(db, FaultProfile.parse(os.environ['MONGO_FAULTS']))
+
+# Initialize Razorpay client (async, pooled; RAZORPAY_API_BASE can point at a local stub)
+razorpay_gateway = RazorpayGateway(
+    key_id=os.environ['RAZORPAY_KEY_ID'],
+    key_secret=os.environ['RAZORPAY_KEY_SECRET'],
+    base_url=os.environ.get('RAZORPAY_API_BASE', 'https://api.razorpay.com/v1'),
+    timeout=float(os.environ.get('RAZORPAY_TIMEOUT', 10)),
+    max_connections=int(os.environ.get('RAZORPAY_MAX_CONNECTIONS', 20)),
+    max_concurrency=int(os.environ.get('RAZORPAY_MAX_CONCURRENCY', 20)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('RAZORPAY_BREAKER_THRESHOLD', 5)),
+        reset_timeout=float(os.environ.get('RAZORPAY_BREAKER_RESET', 30))
+    )
+)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -47,32 +80,272 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+if os.environ.get('MONGO_FAULTS'):
+    logger.warning(f"MongoDB fault injection enabled: {os.environ['MONGO_FAULTS']}")
+
+# Abandoned carts expire this many seconds after their last update
+CART_TTL_SECONDS = int(os.environ.get('CART_TTL_SECONDS', DEFAULT_CART_TTL_SECONDS))
+
+# Responses stored for Idempotency-Key replays are kept this many seconds
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', DEFAULT_IDEMPOTENCY_TTL_SECONDS))
+
+idempotency_store = IdempotencyStore(db.idempotency_keys, ttl=IDEMPOTENCY_TTL_SECONDS)
+
+# Upper bound on operations accepted by one PATCH /cart request
+MAX_CART_OPERATIONS = 100
+
+# Time-ordered, collision-free order numbers (no uniqueness check needed).
+# Each process leases its worker id at startup unless ORDER_WORKER_ID is set.
+order_number_generator = OrderNumberGenerator(configured_worker_id())
+worker_id_lease = WorkerIdLease(
+    db.order_workers,
+    order_number_generator,
+    ttl=int(os.environ.get('ORDER_WORKER_LEASE_SECONDS', 60))
+)
+
 # Helper function to generate order number
 def generate_order_number():
-    return 'ORD-' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    return order_number_generator.next()
+
+# Fields that must never be exposed through public product endpoints
+PRIVATE_PRODUCT_FIELDS = ['download_link', 'pdf_link']
+
+# Routes that serialize stored documents without validating them again
+TRUSTED_READ_ROUTES = {
+    route.strip()
+    for route in os.environ.get('TRUSTED_READ_ROUTES', 'products,testimonials,orders,contact_messages').split(',')
+    if route.strip()
+}
+
+product_encoder = TrustedEncoder(ProductPublic)
+testimonial_encoder = TrustedEncoder(Testimonial)
+order_encoder = TrustedEncoder(Order)
+contact_message_encoder = TrustedEncoder(ContactMessage)
+
+def to_public_product(product):
+    """Build a ProductPublic from a product document, dropping download links"""
+    if "products" in TRUSTED_READ_ROUTES:
+        # ProductPublic has no link fields, so construct() drops them too
+        return product_encoder.construct(product)
+    return ProductPublic(**{k: v for k, v in product.items() if k not in PRIVATE_PRODUCT_FIELDS})
+
+# ==================== CATALOG CACHE ====================
+
+async def load_catalog():
+    """Load the public catalog: product list plus a slug -> product map"""
+    projection = {field: 0 for field in PRIVATE_PRODUCT_FIELDS}
+    products = await db.products.find({}, projection).to_list(None)
+    public_products = [to_public_product(product) for product in products]
+    return {
+        "products": public_products,
+        "by_slug": {product.slug: product for product in public_products},
+        "by_id": {product.id: product for product in public_products}
+    }
+
+# Products change rarely; serve reads from memory and reload after the TTL (seconds)
+catalog_cache = SnapshotCache(
+    "catalog",
+    load_catalog,
+    ttl=int(os.environ.get('CATALOG_CACHE_TTL', 300))
+)
+
+# Cache-Control sent with catalog responses (browsers and CDN)
+CATALOG_CACHE_CONTROL = os.environ.get('CATALOG_CACHE_CONTROL', DEFAULT_CACHE_CONTROL)
+
+async def get_catalog_product(product_id):
+    """Look up a public product by id, falling back to Mongo for products
+    created since the snapshot was built"""
+    catalog = await catalog_cache.get()
+    product = catalog.data["by_id"].get(product_id)
+    if product:
+        return product.dict()
+    product = await db.products.find_one({"id": product_id})
+    return to_public_product(product).dict() if product else None
+
+async def fetch_products_by_id(product_ids):
+    """Fetch full product documents (including download links) in one query"""
+    return await db.products.find({"id": {"$in": product_ids}}).to_list(len(product_ids))
+
+# Full product documents for order pricing and confirmation emails
+product_lookup = ProductLookup(
+    fetch_products_by_id,
+    ttl=int(os.environ.get('PRODUCT_LOOKUP_TTL', 60))
+)
+
+async def load_testimonials():
+    """Load all active testimonials"""
+    testimonials = await db.testimonials.find({"is_active": True}).to_list(1000)
+    if "testimonials" in TRUSTED_READ_ROUTES:
+        return [testimonial_encoder.construct(testimonial) for testimonial in testimonials]
+    return [Testimonial(**testimonial) for testimonial in testimonials]
+
+testimonials_cache = SnapshotCache(
+    "testimonials",
+    load_testimonials,
+    ttl=int(os.environ.get('TESTIMONIALS_CACHE_TTL', 300))
+)
+
+TESTIMONIALS_CACHE_CONTROL = os.environ.get('TESTIMONIALS_CACHE_CONTROL', DEFAULT_CACHE_CONTROL)
+
+# ==================== EMAIL OUTBOX ====================
+
+async def send_order_confirmation(payload):
+    """Outbox handler: build and send the confirmation email for a paid order"""
+    order = await db.orders.find_one({"order_number": payload['order_number']})
+    if not order:
+        logger.error(f"Order not found for confirmation email: {payload['order_number']}")
+        return True  # Nothing to retry
+    
+    # Format date for email
+    created_at = order['created_at']
+    if isinstance(created_at, datetime):
+        formatted_date = created_at.strftime("%B %d, %Y")
+    else:
+        formatted_date = str(created_at)
+    
+    # Fetch product details with download links for purchased items
+    items_with_links = []
+    purchased_product_ids = []
+    products = await product_lookup.get_many([item['product_id'] for item in order['items']])
+    for item in order['items']:
+        product = products.get(item['product_id'])
+        if product:
+            purchased_product_ids.append(item['product_id'])
+            items_with_links.append({
+                'product_id': item['product_id'],
+                'product_title': item['product_title'],
+                'quantity': item['quantity'],
+                'price': item['price'],
+                'download_link': product.get('download_link', ''),
+                'pdf_link': product.get('pdf_link', '')
+            })
+    
+    # Pick other products for recommendations from the catalog (exclude purchased ones)
+    catalog = await catalog_cache.get()
+    other_products = []
+    for prod in catalog.data["products"]:
+        if prod.id in purchased_product_ids:
+            continue
+        other_products.append({
+            'title': prod.title,
+            'image': prod.image,
+            'current_price': prod.current_price
+        })
+        if len(other_products) == 3:
+            break
+    
+    email_data = {
+        'customer_name': order['customer_name'],
+        'customer_email': order['customer_email'],
+        'customer_phone': order['customer_phone'],
+        'city': order['city'],
+        'order_number': order['order_number'],
+        'created_at': formatted_date,
+        'items': order['items'],
+        'items_with_links': items_with_links,
+        'subtotal': order['subtotal'],
+        'total': order['total'],
+        'payment_id': payload['payment_id'],
+        'other_products': other_products
+    }
+    
+    return await send_order_confirmation_email(email_data)
+
+# Emails are stored in db.email_outbox and sent by background workers with retries
+email_outbox = EmailOutbox(
+    db.email_outbox,
+    {"order_confirmation": send_order_confirmation},
+    workers=int(os.environ.get('EMAIL_OUTBOX_WORKERS', 2)),
+    max_attempts=int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+)
+
+# A paid order carries confirmation_pending until its email is queued. Orders
+# still marked this long after payment (the process died between the two
+# writes) are queued by a sweep that runs this often.
+CONFIRMATION_SWEEP_SECONDS = int(os.environ.get('CONFIRMATION_SWEEP_SECONDS', 60))
+
+async def queue_order_confirmation(order_number, payment_id):
+    """Queue the confirmation email, then clear the order's pending marker"""
+    await email_outbox.enqueue(
+        "order_confirmation",
+        {"order_number": order_number, "payment_id": payment_id},
+        dedupe_key=f"order_confirmation:{order_number}"
+    )
+    await db.orders.update_one({"order_number": order_number}, {"$unset": {"confirmation_pending": ""}})
+
+async def sweep_order_confirmations():
+    """Queue confirmations for paid orders whose email was never queued"""
+    cutoff = datetime.utcnow() - timedelta(seconds=CONFIRMATION_SWEEP_SECONDS)
+    orders = await db.orders.find(
+        {"confirmation_pending": True, "updated_at": {"$lt": cutoff}},
+        {"order_number": 1, "razorpay_payment_id": 1}
+    ).to_list(100)
+    for order in orders:
+        logger.warning(f"Queueing missed confirmation email for order {order['order_number']}")
+        await queue_order_confirmation(order['order_number'], order.get('razorpay_payment_id', ''))
+
+async def sweep_order_confirmations_forever():
+    while True:
+        await asyncio.sleep(CONFIRMATION_SWEEP_SECONDS)
+        try:
+            await sweep_order_confirmations()
+        except Exception as e:
+            logger.error(f"Error sweeping order confirmations: {str(e)}")
+
+# ==================== RECENT PURCHASES ====================
+
+# Latest paid orders for the purchase popup, kept in memory
+recent_purchases = RecentPurchases(size=40)
+
+# Other workers' payments are picked up by reloading from Mongo this often (0 disables)
+RECENT_PURCHASES_RESYNC_SECONDS = int(os.environ.get('RECENT_PURCHASES_RESYNC_SECONDS', 300))
+
+# Idle SSE connections get a comment line this often so proxies keep them open
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+
+async def load_recent_purchases():
+    """Seed the recent purchases buffer with the last completed orders"""
+    orders = await db.orders.find(
+        {"status": "completed", "payment_status": "paid"}
+    ).sort("created_at", -1).limit(recent_purchases.size).to_list(recent_purchases.size)
+    recent_purchases.seed(orders)
+
+async def resync_recent_purchases():
+    while True:
+        await asyncio.sleep(RECENT_PURCHASES_RESYNC_SECONDS)
+        try:
+            await load_recent_purchases()
+        except Exception as e:
+            logger.error(f"Error reloading recent purchases: {str(e)}")
 
 # ==================== PRODUCTS ENDPOINTS ====================
 
 @api_router.get("/products", response_model=List[ProductPublic])
-async def get_products():
+async def get_products(request: Request):
     """Get all products (without download links)"""
     try:
-        products = await db.products.find().to_list(1000)
-        # Return products without download_link and pdf_link fields
-        return [ProductPublic(**{k: v for k, v in product.items() if k not in ['download_link', 'pdf_link']}) for product in products]
+        catalog = await catalog_cache.get()
+        body = response_cache.get_body("products", catalog.version, lambda: catalog.data["products"])
+        return cached_json_response(request, body, CATALOG_CACHE_CONTROL)
     except Exception as e:
         logger.error(f"Error fetching products: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching products")
 
 @api_router.get("/products/{slug}", response_model=ProductPublic)
-async def get_product_by_slug(slug: str):
+async def get_product_by_slug(slug: str, request: Request):
     """Get a single product by slug (without download links)"""
     try:
-        product = await db.products.find_one({"slug": slug})
+        catalog = await catalog_cache.get()
+        product = catalog.data["by_slug"].get(slug)
         if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        # Return product without download_link and pdf_link fields
-        return ProductPublic(**{k: v for k, v in product.items() if k not in ['download_link', 'pdf_link']})
+            # Created on another worker since the snapshot was built
+            projection = {field: 0 for field in PRIVATE_PRODUCT_FIELDS}
+            product = await db.products.find_one({"slug": slug}, projection)
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            return to_public_product(product)
+        body = response_cache.get_body(f"product:{slug}", catalog.version, lambda: product)
+        return cached_json_response(request, body, CATALOG_CACHE_CONTROL)
     except HTTPException:
         raise
     except Exception as e:
@@ -91,9 +364,12 @@ async def create_product(product: ProductCreate):
         product_obj = Product(**product.dict())
         await db.products.insert_one(product_obj.dict())
         
+        # Rebuild the catalog so the new product is served immediately
+        await catalog_cache.refresh()
+        product_lookup.invalidate()
+        
         # Return product without sensitive fields
-        product_dict = product_obj.dict()
-        return ProductPublic(**{k: v for k, v in product_dict.items() if k not in ['download_link', 'pdf_link']})
+        return to_public_product(product_obj.dict())
     except HTTPException:
         raise
     except Exception as e:
@@ -108,10 +384,8 @@ async def get_cart(session_id: str):
     try:
         cart = await db.carts.find_one({"session_id": session_id})
         if not cart:
-            # Create empty cart
-            new_cart = Cart(session_id=session_id, items=[])
-            await db.carts.insert_one(new_cart.dict())
-            return new_cart
+            # Return an empty cart without storing it; the first mutation creates it
+            return Cart(session_id=session_id, items=[])
         return Cart(**cart)
     except Exception as e:
         logger.error(f"Error fetching cart: {str(e)}")
@@ -122,82 +396,51 @@ async def add_to_cart(session_id: str, item: CartItemAdd):
     """Add item to cart"""
     try:
         # Get product to verify it exists and get price
-        product = await db.products.find_one({"id": item.product_id})
+        product = await get_catalog_product(item.product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        # Get or create cart
-        cart = await db.carts.find_one({"session_id": session_id})
-        if not cart:
-            cart = Cart(session_id=session_id, items=[])
-            cart_dict = cart.dict()
-        else:
-            cart_dict = cart
-        
-        # Check if item already exists
-        item_exists = False
-        for cart_item in cart_dict.get('items', []):
-            if cart_item['product_id'] == item.product_id:
-                cart_item['quantity'] += item.quantity
-                item_exists = True
-                break
-        
-        if not item_exists:
-            new_item = {
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-                "price_at_time": product['current_price']
-            }
-            if 'items' not in cart_dict:
-                cart_dict['items'] = []
-            cart_dict['items'].append(new_item)
-        
-        cart_dict['updated_at'] = datetime.utcnow()
-        
-        # Update or insert cart
-        await db.carts.update_one(
+        # Increment or append the item and create the cart if needed, in one atomic update
+        cart = await db.carts.find_one_and_update(
             {"session_id": session_id},
-            {"$set": cart_dict},
-            upsert=True
+            [add_item_stage(item.product_id, item.quantity, product['current_price']), touch_stage()],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_cart = await db.carts.find_one({"session_id": session_id})
-        return Cart(**updated_cart)
+        return Cart(**cart)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error adding to cart: {str(e)}")
         raise HTTPException(status_code=500, detail="Error adding to cart")
 
+async def raise_cart_item_not_found(session_id: str):
+    """Raise the right 404 after a cart update matched nothing"""
+    if not await db.carts.count_documents({"session_id": session_id}, limit=1):
+        raise HTTPException(status_code=404, detail="Cart not found")
+    raise HTTPException(status_code=404, detail="Item not found in cart")
+
 @api_router.put("/cart/{session_id}/items/{product_id}", response_model=Cart)
 async def update_cart_item(session_id: str, product_id: str, update: CartItemUpdate):
     """Update cart item quantity"""
     try:
-        cart = await db.carts.find_one({"session_id": session_id})
-        if not cart:
-            raise HTTPException(status_code=404, detail="Cart not found")
-        
-        item_found = False
-        for item in cart.get('items', []):
-            if item['product_id'] == product_id:
-                if update.quantity <= 0:
-                    cart['items'].remove(item)
-                else:
-                    item['quantity'] = update.quantity
-                item_found = True
-                break
-        
-        if not item_found:
-            raise HTTPException(status_code=404, detail="Item not found in cart")
+        if update.quantity <= 0:
+            change = {
+                "$pull": {"items": {"product_id": product_id}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        else:
+            change = {"$set": {"items.$.quantity": update.quantity, "updated_at": datetime.utcnow()}}
         
-        cart['updated_at'] = datetime.utcnow()
-        await db.carts.update_one(
-            {"session_id": session_id},
-            {"$set": cart}
+        # Only matches when the item is in the cart, so "$" addresses that item
+        cart = await db.carts.find_one_and_update(
+            {"session_id": session_id, "items.product_id": product_id},
+            change,
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_cart = await db.carts.find_one({"session_id": session_id})
-        return Cart(**updated_cart)
+        if not cart:
+            await raise_cart_item_not_found(session_id)
+        return Cart(**cart)
     except HTTPException:
         raise
     except Exception as e:
@@ -208,25 +451,61 @@ async def update_cart_item(session_id: str, product_id: str, update: CartItemUpd
 async def remove_from_cart(session_id: str, product_id: str):
     """Remove item from cart"""
     try:
-        cart = await db.carts.find_one({"session_id": session_id})
+        cart = await db.carts.find_one_and_update(
+            {"session_id": session_id},
+            {
+                "$pull": {"items": {"product_id": product_id}},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
         if not cart:
             raise HTTPException(status_code=404, detail="Cart not found")
+        return Cart(**cart)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error removing from cart: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error removing from cart")
+
+@api_router.patch("/cart/{session_id}", response_model=Cart)
+async def apply_cart_operations(session_id: str, batch: CartOperations):
+    """Apply an ordered list of add/update/remove operations in one atomic update"""
+    try:
+        if not batch.operations:
+            return await get_cart(session_id)
+        if len(batch.operations) > MAX_CART_OPERATIONS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_CART_OPERATIONS} operations per request")
         
-        cart['items'] = [item for item in cart.get('items', []) if item['product_id'] != product_id]
-        cart['updated_at'] = datetime.utcnow()
+        prices = {}
+        for operation in batch.operations:
+            if operation.op == "add" and operation.product_id not in prices:
+                product = await get_catalog_product(operation.product_id)
+                if not product:
+                    raise HTTPException(status_code=404, detail=f"Product not found: {operation.product_id}")
+                prices[operation.product_id] = product['current_price']
+        try:
+            stages, required, upsert = batch_update(batch.operations, prices)
+        except InvalidCartOperation as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         
-        await db.carts.update_one(
-            {"session_id": session_id},
-            {"$set": cart}
+        query = {"session_id": session_id}
+        if required:
+            query["items.product_id"] = {"$all": required}
+        cart = await db.carts.find_one_and_update(
+            query,
+            stages,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_cart = await db.carts.find_one({"session_id": session_id})
-        return Cart(**updated_cart)
+        if not cart:
+            await raise_cart_item_not_found(session_id)
+        return Cart(**cart)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error removing from cart: {str(e)}")
-        raise HTTPException(status_code=500, detail="Error removing from cart")
+        logger.error(f"Error applying cart operations: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error applying cart operations")
 
 @api_router.delete("/cart/{session_id}")
 async def clear_cart(session_id: str):
@@ -241,10 +520,11 @@ async def clear_cart(session_id: str):
 # ==================== RAZORPAY ENDPOINTS ====================
 
 @api_router.post("/razorpay/create-order")
-async def create_razorpay_order(order_data: RazorpayOrderCreate):
+@idempotent(idempotency_store, "razorpay_create_order")
+async def create_razorpay_order(order_data: RazorpayOrderCreate, idempotency_key: Optional[str] = Header(None)):
     """Create Razorpay order"""
     try:
-        razorpay_order = razorpay_client.order.create({
+        razorpay_order = await razorpay_gateway.create_order({
             "amount": order_data.amount,  # Amount in paise
             "currency": order_data.currency,
             "receipt": order_data.receipt,
@@ -253,12 +533,16 @@ async def create_razorpay_order(order_data: RazorpayOrderCreate):
         })
         logger.info(f"Razorpay order created: {razorpay_order['id']}")
         return razorpay_order
+    except GatewayError as e:
+        logger.error(f"Error creating Razorpay order: {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=f"Error creating Razorpay order: {str(e)}")
     except Exception as e:
         logger.error(f"Error creating Razorpay order: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating Razorpay order: {str(e)}")
 
 @api_router.post("/razorpay/verify-payment")
-async def verify_payment(payment_data: PaymentVerification):
+@idempotent(idempotency_store, "razorpay_verify_payment")
+async def verify_payment(payment_data: PaymentVerification, idempotency_key: Optional[str] = Header(None)):
     """Verify Razorpay payment signature and clear cart"""
     try:
         # Verify signature
@@ -276,12 +560,8 @@ async def verify_payment(payment_data: PaymentVerification):
         if generated_signature != signature:
             raise HTTPException(status_code=400, detail="Invalid payment signature")
         
-        # Update order with payment details
-        order = await db.orders.find_one({"order_number": payment_data.order_number})
-        if not order:
-            raise HTTPException(status_code=404, detail="Order not found")
-        
-        await db.orders.update_one(
+        # Update order with payment details and get the updated order for email
+        updated_order = await db.orders.find_one_and_update(
             {"order_number": payment_data.order_number},
             {
                 "$set": {
@@ -290,73 +570,19 @@ async def verify_payment(payment_data: PaymentVerification):
                     "razorpay_signature": signature,
                     "payment_status": "paid",
                     "status": "completed",
+                    # Cleared once the email is queued; the sweep catches a crash in between
+                    "confirmation_pending": True,
                     "updated_at": datetime.utcnow()
                 }
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
+        if not updated_order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        recent_purchases.record(updated_order)
         
-        # Get updated order for email
-        updated_order = await db.orders.find_one({"order_number": payment_data.order_number})
-        
-        # Send order confirmation email
-        try:
-            # Format date for email
-            created_at = updated_order['created_at']
-            if isinstance(created_at, datetime):
-                formatted_date = created_at.strftime("%B %d, %Y")
-            else:
-                formatted_date = str(created_at)
-            
-            # Fetch product details with download links for purchased items
-            items_with_links = []
-            purchased_product_ids = []
-            for item in updated_order['items']:
-                product = await db.products.find_one({"id": item['product_id']})
-                if product:
-                    purchased_product_ids.append(item['product_id'])
-                    items_with_links.append({
-                        'product_id': item['product_id'],
-                        'product_title': item['product_title'],
-                        'quantity': item['quantity'],
-                        'price': item['price'],
-                        'download_link': product.get('download_link', ''),
-                        'pdf_link': product.get('pdf_link', '')
-                    })
-            
-            # Fetch other products for recommendations (exclude purchased ones)
-            other_products_cursor = db.products.find({
-                "id": {"$nin": purchased_product_ids}
-            }).limit(3)
-            other_products_list = await other_products_cursor.to_list(3)
-            
-            other_products = []
-            for prod in other_products_list:
-                other_products.append({
-                    'title': prod['title'],
-                    'image': prod['image'],
-                    'current_price': prod['current_price']
-                })
-            
-            email_data = {
-                'customer_name': updated_order['customer_name'],
-                'customer_email': updated_order['customer_email'],
-                'customer_phone': updated_order['customer_phone'],
-                'city': updated_order['city'],
-                'order_number': updated_order['order_number'],
-                'created_at': formatted_date,
-                'items': updated_order['items'],
-                'items_with_links': items_with_links,
-                'subtotal': updated_order['subtotal'],
-                'total': updated_order['total'],
-                'payment_id': payment_id,
-                'other_products': other_products
-            }
-            
-            await send_order_confirmation_email(email_data)
-            logger.info(f"Order confirmation email sent for order: {payment_data.order_number}")
-        except Exception as email_error:
-            # Log error but don't fail the payment verification
-            logger.error(f"Failed to send order confirmation email: {str(email_error)}")
+        # Queue the confirmation email; the outbox workers send it in the background
+        await queue_order_confirmation(updated_order['order_number'], payment_id)
         
         logger.info(f"Payment verified for order: {payment_data.order_number}")
         return {"status": "success", "message": "Payment verified successfully"}
@@ -367,121 +593,144 @@ async def verify_payment(payment_data: PaymentVerification):
         logger.error(f"Error verifying payment: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error verifying payment: {str(e)}")
 
+# ==================== CHECKOUT ENDPOINTS ====================
+
+@api_router.post("/checkout", response_model=CheckoutSession)
+@idempotent(idempotency_store, "checkout")
+async def create_checkout_session(order_create: OrderCreate, idempotency_key: Optional[str] = Header(None)):
+    """Create the order and its Razorpay order in one call"""
+    try:
+        order = await build_order_from_cart(order_create)
+        
+        # Storing the order and creating the Razorpay order are independent
+        insert_result, razorpay_result = await asyncio.gather(
+            db.orders.insert_one(order.dict()),
+            razorpay_gateway.create_order({
+                "amount": order.total * 100,  # Amount in paise
+                "currency": "INR",
+                "receipt": order.order_number,
+                "notes": {
+                    "order_number": order.order_number,
+                    "customer_email": order.customer_email
+                },
+                "payment_capture": 1
+            }),
+            return_exceptions=True
+        )
+        if isinstance(insert_result, Exception):
+            raise insert_result
+        if isinstance(razorpay_result, GatewayError):
+            logger.error(f"Error creating Razorpay order for {order.order_number}: {str(razorpay_result)}")
+            raise HTTPException(status_code=razorpay_result.status_code, detail=f"Error creating Razorpay order: {str(razorpay_result)}")
+        if isinstance(razorpay_result, Exception):
+            raise razorpay_result
+        
+        logger.info(f"Checkout created: {order.order_number} / {razorpay_result['id']}")
+        return CheckoutSession(
+            order=order,
+            razorpay_order_id=razorpay_result['id'],
+            amount=razorpay_result['amount'],
+            currency=razorpay_result['currency'],
+            key_id=os.environ['RAZORPAY_KEY_ID']
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating checkout: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error creating checkout")
+
 # ==================== ORDERS ENDPOINTS ====================
 
 @api_router.get("/orders/recent-purchases")
 async def get_recent_purchases():
     """Get recent 40 purchases for notification popup (public endpoint)"""
     try:
-        # Get last 40 completed orders
-        orders = await db.orders.find(
-            {"status": "completed", "payment_status": "paid"}
-        ).sort("created_at", -1).limit(40).to_list(40)
-        
-        # Format for popup display
-        purchases = []
-        for order in orders:
-            # Get first item from order
-            if order.get('items') and len(order['items']) > 0:
-                first_item = order['items'][0]
-                
-                # Calculate time ago
-                created_at = order.get('created_at')
-                if created_at:
-                    from datetime import datetime, timezone
-                    if isinstance(created_at, str):
-                        created_at = datetime.fromisoformat(created_at)
-                    
-                    now = datetime.now(timezone.utc)
-                    if created_at.tzinfo is None:
-                        created_at = created_at.replace(tzinfo=timezone.utc)
-                    
-                    diff = now - created_at
-                    
-                    # Format time ago
-                    if diff.total_seconds() < 3600:  # Less than 1 hour
-                        minutes = int(diff.total_seconds() / 60)
-                        time_ago = f"{minutes} minutes ago" if minutes > 1 else "1 minute ago"
-                    elif diff.total_seconds() < 86400:  # Less than 1 day
-                        hours = int(diff.total_seconds() / 3600)
-                        time_ago = f"{hours} hours ago" if hours > 1 else "1 hour ago"
-                    else:
-                        days = int(diff.total_seconds() / 86400)
-                        time_ago = f"{days} days ago" if days > 1 else "1 day ago"
-                else:
-                    time_ago = "recently"
-                
-                purchases.append({
-                    "customerName": order.get('customer_name', 'Anonymous'),
-                    "productName": first_item.get('product_title', 'Product'),
-                    "timeAgo": time_ago,
-                    "location": order.get('city', 'India')
-                })
-        
-        # If less than 40 orders, pad with mock data
-        if len(purchases) < 40:
-            mock_purchases = [
-                { "customerName": "Rajesh K.", "productName": "Software System Design", "timeAgo": "2 hours ago", "location": "Mumbai, India" },
-                { "customerName": "Priya S.", "productName": "Software Architecture Patterns", "timeAgo": "3 hours ago", "location": "Bangalore, India" },
-                { "customerName": "Amit P.", "productName": "Foundations of Software Design Volume 2", "timeAgo": "4 hours ago", "location": "Delhi, India" },
-            ]
-            purchases.extend(mock_purchases[:40 - len(purchases)])
-        
-        return purchases
-        
+        return recent_purchases.snapshot()
     except Exception as e:
         logger.error(f"Error fetching recent purchases: {str(e)}")
         # Return empty array instead of failing
         return []
 
+@api_router.get("/orders/recent-purchases/stream")
+async def stream_recent_purchases():
+    """Server-Sent Events: the current purchases on connect, then each new purchase"""
+    async def events():
+        # Subscribe only once the body is being streamed: a client that
+        # disconnects before then never runs this generator, so its finally
+        # would never unsubscribe
+        queue = recent_purchases.subscribe()
+        SSE_SUBSCRIBERS.inc()
+        try:
+            yield sse_event("snapshot", recent_purchases.snapshot())
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield message
+        finally:
+            recent_purchases.unsubscribe(queue)
+            SSE_SUBSCRIBERS.dec()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def build_order_from_cart(order_create: OrderCreate):
+    """Price the session's cart and build a pending Order (not yet stored)"""
+    # Get cart
+    cart = await db.carts.find_one({"session_id": order_create.session_id})
+    if not cart or not cart.get('items'):
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    
+    # Get product details for order items
+    order_items = []
+    subtotal = 0
+    total_original_price = 0
+    
+    products = await product_lookup.get_many([cart_item['product_id'] for cart_item in cart['items']])
+    for cart_item in cart['items']:
+        product = products.get(cart_item['product_id'])
+        if product:
+            item_total = product['current_price'] * cart_item['quantity']
+            subtotal += item_total
+            total_original_price += product['original_price'] * cart_item['quantity']
+            
+            order_items.append(OrderItem(
+                product_id=cart_item['product_id'],
+                product_title=product['title'],
+                quantity=cart_item['quantity'],
+                price=product['current_price']
+            ))
+    
+    discount = total_original_price - subtotal
+    
+    return Order(
+        order_number=generate_order_number(),
+        customer_email=order_create.customer_email,
+        customer_name=order_create.customer_name,
+        customer_phone=order_create.customer_phone,
+        billing_address=order_create.billing_address,
+        city=order_create.city,
+        state=order_create.state,
+        pincode=order_create.pincode,
+        items=order_items,
+        subtotal=subtotal,
+        discount=discount,
+        total=subtotal,
+        status="pending",
+        payment_status="pending"
+    )
+
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_create: OrderCreate):
+@idempotent(idempotency_store, "orders")
+async def create_order(order_create: OrderCreate, idempotency_key: Optional[str] = Header(None)):
     """Create order from cart"""
     try:
-        # Get cart
-        cart = await db.carts.find_one({"session_id": order_create.session_id})
-        if not cart or not cart.get('items'):
-            raise HTTPException(status_code=400, detail="Cart is empty")
-        
-        # Get product details for order items
-        order_items = []
-        subtotal = 0
-        total_original_price = 0
-        
-        for cart_item in cart['items']:
-            product = await db.products.find_one({"id": cart_item['product_id']})
-            if product:
-                item_total = product['current_price'] * cart_item['quantity']
-                subtotal += item_total
-                total_original_price += product['original_price'] * cart_item['quantity']
-                
-                order_items.append(OrderItem(
-                    product_id=cart_item['product_id'],
-                    product_title=product['title'],
-                    quantity=cart_item['quantity'],
-                    price=product['current_price']
-                ))
-        
-        discount = total_original_price - subtotal
-        
-        # Create order
-        order = Order(
-            order_number=generate_order_number(),
-            customer_email=order_create.customer_email,
-            customer_name=order_create.customer_name,
-            customer_phone=order_create.customer_phone,
-            billing_address=order_create.billing_address,
-            city=order_create.city,
-            state=order_create.state,
-            pincode=order_create.pincode,
-            items=order_items,
-            subtotal=subtotal,
-            discount=discount,
-            total=subtotal,
-            status="pending",
-            payment_status="pending"
-        )
-        
+        order = await build_order_from_cart(order_create)
         await db.orders.insert_one(order.dict())
         
         # Don't clear cart yet - will be cleared after successful payment
@@ -507,24 +756,94 @@ async def get_order(order_number: str):
         logger.error(f"Error fetching order: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching order")
 
+# Order fields a caller may request with ?fields=
+ORDER_FIELDS = set(Order.__fields__)
+
+def parse_order_fields(fields: Optional[str]):
+    """Validate a comma separated ?fields= list against the Order model"""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in ORDER_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown order fields: {', '.join(unknown)}")
+    return requested
+
+def serialize_order(order, fields, trusted):
+    """Response dict for an order: the full Order, or only the requested fields.
+
+    Trusted orders skip validation and are left for dumps() to encode.
+    """
+    if fields is not None:
+        selected = {field: order[field] for field in fields if field in order}
+        return selected if trusted else jsonable_encoder(selected)
+    if trusted:
+        return order_encoder.to_dict(order)
+    return jsonable_encoder(Order(**order))
+
 @api_router.get("/orders/email/{email}", response_model=List[Order])
-async def get_orders_by_email(email: str):
-    """Get all orders for an email"""
+async def get_orders_by_email(
+    email: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    response_format: str = Query("json", alias="format", pattern="^(json|ndjson)$")
+):
+    """Get orders for an email (case-insensitive), newest first.
+
+    Pages are keyed on (created_at, _id); pass the X-Next-Cursor header of one
+    page as ?cursor= to get the next. ?fields=a,b returns only those fields.
+    ?format=ndjson streams every order after the cursor, one JSON per line.
+    """
     try:
-        orders = await db.orders.find({"customer_email": email}).to_list(1000)
-        return [Order(**order) for order in orders]
+        trusted = "orders" in TRUSTED_READ_ROUTES
+        requested_fields = parse_order_fields(fields)
+        projection = None
+        if requested_fields is not None:
+            # created_at and _id are needed for the cursor
+            projection = {field: 1 for field in requested_fields + ["created_at"]}
+        
+        query = keyset_filter({"customer_email": email}, cursor)
+        orders_cursor = db.orders.find(query, projection, collation=EMAIL_COLLATION).sort(keyset_sort())
+        
+        if response_format == "ndjson":
+            async def stream_orders():
+                async for order in orders_cursor.batch_size(100):
+                    yield dumps(serialize_order(order, requested_fields, trusted)) + b"\n"
+            return StreamingResponse(stream_orders(), media_type="application/x-ndjson")
+        
+        # Fetch one extra order to know whether there is a next page
+        orders = await orders_cursor.limit(limit + 1).to_list(limit + 1)
+        headers = {}
+        if len(orders) > limit:
+            orders = orders[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(orders[-1])
+        body = [serialize_order(order, requested_fields, trusted) for order in orders]
+        if trusted:
+            return trusted_json_response(body, headers)
+        return JSONResponse(body, headers=headers)
+    except HTTPException:
+        raise
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error fetching orders: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching orders")
 
 # ==================== CONTACT ENDPOINTS ====================
 
+CONTACT_STATUSES = ["new", "handled"]
+
+# Inbox counts per status, kept in db.counters so the admin never counts the collection
+contact_counts = StatusCounts(db.counters, "contact_messages", db.contact_messages, CONTACT_STATUSES)
+
 @api_router.post("/contact")
 async def submit_contact_message(message: ContactMessageCreate):
     """Submit contact form and send email notification"""
     try:
         contact_msg = ContactMessage(**message.dict())
         await db.contact_messages.insert_one(contact_msg.dict())
+        await contact_counts.increment(contact_msg.status)
         
         # Send email notification to sell@bookblaze.org
         try:
@@ -546,27 +865,134 @@ async def submit_contact_message(message: ContactMessageCreate):
         raise HTTPException(status_code=500, detail="Error submitting message")
 
 @api_router.get("/contact/messages", response_model=List[ContactMessage])
-async def get_contact_messages():
-    """Get all contact messages (Admin)"""
+async def get_contact_messages(
+    status: Optional[str] = Query(None, pattern="^(new|handled)$"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """Get contact messages, newest first (Admin).
+
+    Filter with ?status=new|handled. Pages work like order history: pass the
+    X-Next-Cursor header of one page as ?cursor= to get the next.
+    """
     try:
-        messages = await db.contact_messages.find().sort("created_at", -1).to_list(1000)
-        return [ContactMessage(**msg) for msg in messages]
+        query = {"status": status} if status else {}
+        messages = await db.contact_messages.find(keyset_filter(query, cursor)).sort(keyset_sort()).limit(limit + 1).to_list(limit + 1)
+        headers = {}
+        if len(messages) > limit:
+            messages = messages[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(messages[-1])
+        if "contact_messages" in TRUSTED_READ_ROUTES:
+            return trusted_json_response([contact_message_encoder.to_dict(msg) for msg in messages], headers)
+        body = [jsonable_encoder(ContactMessage(**msg)) for msg in messages]
+        return JSONResponse(body, headers=headers)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error fetching messages: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching messages")
 
+@api_router.get("/contact/messages/counts")
+async def get_contact_message_counts():
+    """Message counts per status (Admin)"""
+    try:
+        return await contact_counts.get()
+    except Exception as e:
+        logger.error(f"Error fetching message counts: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error fetching message counts")
+
+@api_router.patch("/contact/messages/{message_id}", response_model=ContactMessage)
+async def update_contact_message_status(message_id: str, update: ContactMessageStatusUpdate):
+    """Mark a contact message as new or handled (Admin)"""
+    try:
+        # Only a real status change moves the counts
+        previous = await db.contact_messages.find_one_and_update(
+            {"id": message_id, "status": {"$ne": update.status}},
+            {"$set": {"status": update.status}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is not None:
+            await contact_counts.move(previous.get('status', "new"), update.status)
+            previous['status'] = update.status
+            return ContactMessage(**previous)
+        
+        message = await db.contact_messages.find_one({"id": message_id})
+        if not message:
+            raise HTTPException(status_code=404, detail="Message not found")
+        return ContactMessage(**message)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating message: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error updating message")
+
 # ==================== TESTIMONIALS ENDPOINTS ====================
 
 @api_router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials():
+async def get_testimonials(request: Request):
     """Get all active testimonials"""
     try:
-        testimonials = await db.testimonials.find({"is_active": True}).to_list(1000)
-        return [Testimonial(**testimonial) for testimonial in testimonials]
+        testimonials = await testimonials_cache.get()
+        body = response_cache.get_body("testimonials", testimonials.version, lambda: testimonials.data)
+        return cached_json_response(request, body, TESTIMONIALS_CACHE_CONTROL)
     except Exception as e:
         logger.error(f"Error fetching testimonials: {str(e)}")
         raise HTTPException(status_code=500, detail="Error fetching testimonials")
 
+# ==================== HOME PAGE ====================
+
+# The bundle can include a cart, so it must not be stored by shared caches
+HOME_CACHE_CONTROL = os.environ.get('HOME_CACHE_CONTROL', "private, no-cache")
+
+async def load_cart_summary(session_id):
+    """Cart items with count and subtotal, or None without a session"""
+    if not session_id:
+        return None
+    cart = await db.carts.find_one({"session_id": session_id}, {"_id": 0, "items": 1})
+    items = [CartItem(**item) for item in (cart or {}).get('items', [])]
+    return CartSummary(
+        session_id=session_id,
+        items=items,
+        item_count=sum(item.quantity for item in items),
+        subtotal=sum(item.price_at_time * item.quantity for item in items)
+    )
+
+@api_router.get("/home", response_model=HomePage)
+async def get_home(request: Request, session_id: Optional[str] = None):
+    """Everything the home page needs for first paint in one response"""
+    try:
+        catalog, testimonials, cart = await asyncio.gather(
+            catalog_cache.get(),
+            testimonials_cache.get(),
+            load_cart_summary(session_id)
+        )
+        # Catalog and testimonials reuse the bodies cached for their own
+        # endpoints; only the cart and recent purchases are serialized here
+        body = ComposedBody({
+            "products": response_cache.get_body("products", catalog.version, lambda: catalog.data["products"]),
+            "testimonials": response_cache.get_body("testimonials", testimonials.version, lambda: testimonials.data),
+            "cart": cart,
+            "recent_purchases": recent_purchases.snapshot()
+        })
+        return cached_json_response(request, body, HOME_CACHE_CONTROL)
+    except Exception as e:
+        logger.error(f"Error fetching home page: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error fetching home page")
+
+# ==================== METRICS ====================
+
+# Bearer token Prometheus must send (authorization.credentials in the scrape
+# config). Without it /api/metrics is public; restrict it at the proxy instead.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus metrics"""
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -576,8 +1002,53 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-Id"],
 )
 
+# Profile requests carrying a signed X-Profile-Token header, or a random sample
+app.add_middleware(
+    ProfilingMiddleware,
+    secret=os.environ.get('PROFILE_SECRET', ''),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    directory=os.environ.get('PROFILE_DIR', '/tmp/bookblaze-profiles'),
+    max_files=int(os.environ.get('PROFILE_MAX_FILES', 50))
+)
+
+# Outermost, so the timing covers every other middleware
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def create_db_indexes():
+    await ensure_indexes(db, CART_TTL_SECONDS, IDEMPOTENCY_TTL_SECONDS)
+
+@app.on_event("startup")
+async def lease_order_worker_id():
+    if order_number_generator.worker_id is None:
+        await worker_id_lease.start()
+
+@app.on_event("startup")
+async def start_email_outbox():
+    email_outbox.start()
+    if CONFIRMATION_SWEEP_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(sweep_order_confirmations_forever()))
+
+background_tasks = []
+
+@app.on_event("startup")
+async def start_recent_purchases():
+    try:
+        await load_recent_purchases()
+    except Exception as e:
+        logger.error(f"Error loading recent purchases: {str(e)}")
+    if RECENT_PURCHASES_RESYNC_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(resync_recent_purchases()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await email_outbox.stop()
+    await worker_id_lease.stop()
+    await close_smtp_pool()
+    await razorpay_gateway.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Immutable view of a dataset loaded from MongoDB"""
+
+    def __init__(self, version, data, loaded_at):
+        self.version = version
+        self.data = data
+        self.loaded_at = loaded_at
+
+
+class SnapshotCache:
+    """In-memory, versioned snapshot of a read-mostly collection.
+
+    The loader is an async callable returning the data to cache. The snapshot is
+    loaded on first use and rebuilt when ``refresh()`` is called (e.g. right
+    after a write). Once it is older than ``ttl`` seconds, reads keep getting
+    it while one background task rebuilds it; if that rebuild fails the old
+    snapshot stays in service. The version increases on every rebuild.
+    """
+
+    def __init__(self, name, loader, ttl):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self._snapshot = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self._refresh_task = None
+
+    def _is_fresh(self, snapshot):
+        return snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl
+
+    async def get(self):
+        """Return the current snapshot, loading it on first use"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            async with self._lock:
+                # Another request may have loaded it while we were waiting
+                if self._snapshot is not None:
+                    return self._snapshot
+                return await self._rebuild()
+
+        if not self._is_fresh(snapshot) and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_expired())
+        return snapshot
+
+    async def refresh(self):
+        """Rebuild the snapshot immediately"""
+        async with self._lock:
+            return await self._rebuild()
+
+    async def _refresh_expired(self):
+        try:
+            async with self._lock:
+                if not self._is_fresh(self._snapshot):
+                    await self._rebuild()
+        except Exception as e:
+            logger.error(f"Error rebuilding {self.name} snapshot, still serving version {self._version}: {str(e)}")
+
+    async def _rebuild(self):
+        data = await self.loader()
+        self._version += 1
+        self._snapshot = Snapshot(self._version, data, time.monotonic())
+        logger.info(f"Rebuilt {self.name} snapshot (version {self._version})")
+        return self._snapshot
@@ -0,0 +1,54 @@
+from pymongo import ReturnDocument
+
+
+class StatusCounts:
+    """Per-status document counts kept in a single counter document.
+
+    Writers adjust the counter with ``$inc`` alongside their own write, so
+    reading the counts is one ``_id`` lookup however large the counted
+    collection grows. If the counter document is missing (first start, or
+    deleted to force a recount) it is rebuilt from the counted collection by
+    the next read or write.
+    """
+
+    def __init__(self, counters, counter_id, source, statuses):
+        self.counters = counters
+        self.counter_id = counter_id
+        self.source = source
+        self.statuses = statuses
+
+    async def increment(self, status, amount=1):
+        await self._inc({f"counts.{status}": amount, "total": amount})
+
+    async def move(self, old_status, new_status):
+        """Count a document that changed from old_status to new_status"""
+        await self._inc({f"counts.{old_status}": -1, f"counts.{new_status}": 1})
+
+    async def _inc(self, changes):
+        # Never upsert: a counter created here would only count this change,
+        # not the documents already in the collection. Call after the counted
+        # write, so the recount includes it.
+        result = await self.counters.update_one({"_id": self.counter_id}, {"$inc": changes})
+        if result.matched_count == 0:
+            await self.rebuild()
+
+    async def get(self):
+        """{"total": n, "<status>": n, ...} with every known status present"""
+        doc = await self.counters.find_one({"_id": self.counter_id})
+        if doc is None:
+            doc = await self.rebuild()
+        counts = {status: 0 for status in self.statuses}
+        counts.update(doc.get('counts', {}))
+        return {"total": doc.get('total', 0), **counts}
+
+    async def rebuild(self):
+        """Recount the source collection and replace the counter document"""
+        counts = {}
+        async for row in self.source.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row['_id'] or "new"] = counts.get(row['_id'] or "new", 0) + row['count']
+        return await self.counters.find_one_and_replace(
+            {"_id": self.counter_id},
+            {"counts": counts, "total": sum(counts.values())},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
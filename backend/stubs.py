@@ -0,0 +1,193 @@
+"""Local stand-ins for Razorpay and SMTP.
+
+Used by the load test (loadtest.py) so the API can run without network
+access or real credentials:
+
+- RazorpayStub serves POST /v1/orders like the Razorpay Orders API. Point
+  RAZORPAY_API_BASE at ``stub.base_url``.
+- SMTPSink accepts (and discards) every message. Set SMTP_HOST/SMTP_PORT to
+  its address and SMTP_USE_TLS=false.
+
+Both take an optional FaultProfile (fault_injection.py) to add latency,
+errors and stalls. Run them on their own next to a normally started API:
+
+    python stubs.py --razorpay-port 9000 --smtp-port 2525 \
+        --razorpay-faults "latency=lognormal:150:0.6,errors=0.01" \
+        --smtp-faults "latency=200-800,stall=0.01,stall_seconds=60"
+"""
+import argparse
+import asyncio
+import secrets
+import socket
+import time
+
+import uvicorn
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from fault_injection import FaultProfile
+
+
+def free_port(host="127.0.0.1"):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def razorpay_error(description, status_code=400, code="BAD_REQUEST_ERROR"):
+    return JSONResponse({"error": {"code": code, "description": description}}, status_code=status_code)
+
+
+class RazorpayStub:
+    """Razorpay Orders API stand-in served by uvicorn on the current event loop.
+
+    Validates requests like order.create does. Injected errors are answered
+    with a 500 SERVER_ERROR; injected stalls outlast the client's timeout.
+    """
+
+    def __init__(self, host="127.0.0.1", port=None, faults=None):
+        self.host = host
+        self.port = port or free_port(host)
+        self.faults = faults or FaultProfile()
+        self.orders_created = 0
+        self.app = Starlette(routes=[Route("/v1/orders", self.create_order, methods=["POST"])])
+        self._server = None
+        self._task = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def create_order(self, request):
+        delay, fails = self.faults.next_fault()
+        if delay:
+            await asyncio.sleep(delay)
+        if fails:
+            return razorpay_error("Injected fault", status_code=500, code="SERVER_ERROR")
+
+        if "authorization" not in request.headers:
+            return razorpay_error("The api key provided is invalid", status_code=401)
+        try:
+            data = await request.json()
+        except ValueError:
+            return razorpay_error("Invalid JSON body")
+        amount = data.get("amount")
+        if not isinstance(amount, int) or amount < 100:
+            return razorpay_error("The amount must be atleast INR 1.00")
+        currency = data.get("currency", "INR")
+        if not isinstance(currency, str) or len(currency) != 3:
+            return razorpay_error("The currency field is invalid")
+        if len(str(data.get("receipt") or "")) > 40:
+            return razorpay_error("receipt: the length must be no more than 40.")
+        if len(data.get("notes") or {}) > 15:
+            return razorpay_error("notes: the number of notes must be no more than 15.")
+        self.orders_created += 1
+        return JSONResponse({
+            "id": f"order_{secrets.token_hex(7)}",
+            "entity": "order",
+            "amount": amount,
+            "amount_paid": 0,
+            "amount_due": amount,
+            "currency": currency,
+            "receipt": data.get("receipt"),
+            "offer_id": None,
+            "status": "created",
+            "attempts": 0,
+            "notes": data.get("notes", {}),
+            "created_at": int(time.time())
+        })
+
+    async def start(self):
+        # Stalled requests must not hold up shutdown
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", lifespan="off",
+                                timeout_graceful_shutdown=1)
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._task
+
+
+class SinkHandler:
+    def __init__(self, faults):
+        self.faults = faults
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        delay, fails = self.faults.next_fault()
+        if delay:
+            await asyncio.sleep(delay)
+        if fails:
+            return "451 4.3.0 Injected temporary failure"
+        self.received += 1
+        return "250 Message accepted"
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+class SMTPSink:
+    """SMTP server that accepts any login and discards every message.
+
+    aiosmtpd runs it on its own thread and event loop, so it never competes
+    with the API for the loop under load.
+    """
+
+    def __init__(self, host="127.0.0.1", port=None, faults=None):
+        self.host = host
+        self.port = port or free_port(host)
+        self.handler = SinkHandler(faults or FaultProfile())
+        self._controller = Controller(
+            self.handler,
+            hostname=host,
+            port=self.port,
+            authenticator=accept_any_login,
+            auth_require_tls=False
+        )
+
+    @property
+    def received(self):
+        return self.handler.received
+
+    def start(self):
+        self._controller.start()
+
+    def stop(self):
+        self._controller.stop()
+
+
+async def serve(args):
+    razorpay = RazorpayStub(args.host, args.razorpay_port, FaultProfile.parse(args.razorpay_faults))
+    smtp = SMTPSink(args.host, args.smtp_port, FaultProfile.parse(args.smtp_faults))
+    await razorpay.start()
+    smtp.start()
+    print(f"RAZORPAY_API_BASE={razorpay.base_url}")
+    print(f"SMTP_HOST={smtp.host} SMTP_PORT={smtp.port} SMTP_USE_TLS=false")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await razorpay.stop()
+        smtp.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Razorpay and SMTP stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--razorpay-port", type=int, default=9000)
+    parser.add_argument("--smtp-port", type=int, default=2525)
+    parser.add_argument("--razorpay-faults", default="", help="fault profile, see fault_injection.py")
+    parser.add_argument("--smtp-faults", default="", help="fault profile, see fault_injection.py")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,48 @@
+"""Serialization for documents this API wrote itself.
+
+Documents in MongoDB were validated by their Pydantic model on the way in,
+so validating them again on every read only costs CPU. TrustedEncoder turns
+a stored document straight into a response dict (filling model defaults for
+missing fields), and ``dumps`` encodes it with orjson.
+"""
+import orjson
+from starlette.responses import Response
+
+
+def dumps(payload):
+    """Encode a payload of plain dicts, lists and datetimes as compact JSON bytes"""
+    return orjson.dumps(payload)
+
+
+class TrustedEncoder:
+    """Response dicts for a model's stored documents, without validation.
+
+    Field names and defaults are resolved once, so encoding a document is a
+    dict comprehension rather than a model build plus jsonable_encoder.
+    """
+
+    def __init__(self, model, exclude=()):
+        self.model = model
+        self._fields = [
+            (name, field) for name, field in model.model_fields.items() if name not in exclude
+        ]
+        self._names = {name for name, _ in self._fields}
+
+    def to_dict(self, doc):
+        """The document's model fields; unknown keys such as _id are dropped"""
+        result = {}
+        for name, field in self._fields:
+            if name in doc:
+                result[name] = doc[name]
+            elif not field.is_required():
+                result[name] = field.get_default(call_default_factory=True)
+        return result
+
+    def construct(self, doc):
+        """A model instance built with model_construct (no validation)"""
+        return self.model.model_construct(**{k: v for k, v in doc.items() if k in self._names})
+
+
+def trusted_json_response(payload, headers=None):
+    """JSONResponse equivalent for a payload of plain values"""
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
@@ -26,6 +26,9 @@ export const cartAPI = {
   removeItem: (sessionId, productId) => 
     apiClient.delete(`/cart/${sessionId}/items/${productId}`),
   clearCart: (sessionId) => apiClient.delete(`/cart/${sessionId}`),
+  // operations: [{ op: 'add' | 'update' | 'remove', product_id, quantity }]
+  applyOperations: (sessionId, operations) =>
+    apiClient.patch(`/cart/${sessionId}`, { operations }),
 };
 
 // Orders API
@@ -46,6 +49,11 @@ export const testimonialsAPI = {
   getAll: () => apiClient.get('/testimonials'),
 };
 
+// Home page bundle API
+export const homeAPI = {
+  get: (sessionId) => apiClient.get('/home', { params: { session_id: sessionId } }),
+};
+
 // Helper to get or create session ID
 export const getSessionId = () => {
   let sessionId = localStorage.getItem('session_id');
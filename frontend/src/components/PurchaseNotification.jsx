@@ -8,7 +8,7 @@ const PurchaseNotification = () => {
   const [recentPurchases, setRecentPurchases] = useState([]);
   const [loading, setLoading] = useState(true);
 
-  // Fetch real purchases from database
+  // Fetch real purchases from database, then receive new ones as they happen
   useEffect(() => {
     const fetchRecentPurchases = async () => {
       try {
@@ -26,11 +26,29 @@ const PurchaseNotification = () => {
       }
     };
 
-    fetchRecentPurchases();
-    // Refresh purchases every 5 minutes to get latest orders
-    const refreshInterval = setInterval(fetchRecentPurchases, 300000);
-    
-    return () => clearInterval(refreshInterval);
+    if (typeof window.EventSource === 'undefined') {
+      fetchRecentPurchases();
+      // Refresh purchases every 5 minutes to get latest orders
+      const refreshInterval = setInterval(fetchRecentPurchases, 300000);
+      return () => clearInterval(refreshInterval);
+    }
+
+    // The stream sends the current list on connect and each new purchase after that
+    const source = new EventSource(`${process.env.REACT_APP_BACKEND_URL}/api/orders/recent-purchases/stream`);
+    source.addEventListener('snapshot', (event) => {
+      const data = JSON.parse(event.data);
+      if (data && data.length > 0) {
+        setRecentPurchases(data);
+      }
+      setLoading(false);
+    });
+    source.addEventListener('purchase', (event) => {
+      const purchase = JSON.parse(event.data);
+      setRecentPurchases(prev => [purchase, ...prev].slice(0, 40));
+    });
+    source.onerror = () => setLoading(false);
+
+    return () => source.close();
   }, []);
 
   useEffect(() => {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { ShoppingBag, CheckCircle, Loader2 } from 'lucide-react';
 import { Button } from '../components/ui/button';
@@ -36,6 +36,9 @@ const Checkout = () => {
 
   const [errors, setErrors] = useState({});
 
+  // Idempotency-Key of the current checkout attempt, reused while the order details are unchanged
+  const checkoutAttempt = useRef(null);
+
   useEffect(() => {
     fetchCart();
     loadRazorpayScript();
@@ -136,7 +139,7 @@ const Checkout = () => {
     setProcessing(true);
 
     try {
-      // Step 1: Create order in our database
+      // Step 1: Create order and Razorpay order in one request
       const sessionId = getSessionId();
       const orderData = {
         session_id: sessionId,
@@ -149,59 +152,49 @@ const Checkout = () => {
         pincode: ""
       };
 
-      const orderResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/orders`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(orderData)
-      });
-
-      if (!orderResponse.ok) {
-        throw new Error('Failed to create order');
+      // A double submit or a retry of the same details replays the first
+      // order instead of creating another one
+      const body = JSON.stringify(orderData);
+      if (!checkoutAttempt.current || checkoutAttempt.current.body !== body) {
+        checkoutAttempt.current = {
+          key: 'checkout-' + Math.random().toString(36).substr(2, 9) + '-' + Date.now(),
+          body
+        };
       }
 
-      const order = await orderResponse.json();
-      const totalAmount = calculateSubtotal();
-
-      // Step 2: Create Razorpay order
-      const razorpayOrderResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/razorpay/create-order`, {
+      const checkoutResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/checkout`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': checkoutAttempt.current.key,
         },
-        body: JSON.stringify({
-          amount: totalAmount * 100, // Convert to paise
-          currency: "INR",
-          receipt: order.order_number,
-          notes: {
-            order_number: order.order_number,
-            customer_email: formData.email
-          }
-        })
+        body
       });
 
-      if (!razorpayOrderResponse.ok) {
-        throw new Error('Failed to create Razorpay order');
+      if (!checkoutResponse.ok) {
+        throw new Error('Failed to create order');
       }
 
-      const razorpayOrder = await razorpayOrderResponse.json();
+      const checkout = await checkoutResponse.json();
+      const order = checkout.order;
 
-      // Step 3: Open Razorpay checkout
+      // Step 2: Open Razorpay checkout
       const options = {
-        key: process.env.REACT_APP_RAZORPAY_KEY_ID,
-        amount: razorpayOrder.amount,
-        currency: razorpayOrder.currency,
+        key: checkout.key_id,
+        amount: checkout.amount,
+        currency: checkout.currency,
         name: "BookBlaze",
         description: "eBook Purchase",
-        order_id: razorpayOrder.id,
+        order_id: checkout.razorpay_order_id,
         handler: async function (response) {
           try {
-            // Step 4: Verify payment on backend
+            // Step 3: Verify payment on backend
             const verifyResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/razorpay/verify-payment`, {
               method: 'POST',
               headers: {
                 'Content-Type': 'application/json',
+                // Retries of the same payment replay the stored result
+                'Idempotency-Key': response.razorpay_payment_id,
               },
               body: JSON.stringify({
                 razorpay_order_id: response.razorpay_order_id,
@@ -215,7 +208,8 @@ const Checkout = () => {
               throw new Error('Payment verification failed');
             }
 
-            // Step 5: Clear cart and show success
+            // Step 4: Clear cart and show success
+            checkoutAttempt.current = null;
             await cartAPI.clearCart(sessionId);
             window.dispatchEvent(new Event('cartUpdated'));
             
@@ -5,7 +5,7 @@ import ProductCard from '../components/ProductCard';
 import TestimonialCard from '../components/TestimonialCard';
 import { heroBook } from '../mockData';
 import { useToast } from '../hooks/use-toast';
-import { productsAPI, cartAPI, testimonialsAPI, getSessionId } from '../api/client';
+import { homeAPI, cartAPI, getSessionId } from '../api/client';
 
 const Home = () => {
   const { toast } = useToast();
@@ -19,13 +19,11 @@ const Home = () => {
 
   const fetchData = async () => {
     try {
-      const [productsRes, testimonialsRes] = await Promise.all([
-        productsAPI.getAll(),
-        testimonialsAPI.getAll()
-      ]);
+      // One request for everything on first paint
+      const response = await homeAPI.get(getSessionId());
       
-      setProducts(productsRes.data);
-      setTestimonials(testimonialsRes.data);
+      setProducts(response.data.products);
+      setTestimonials(response.data.testimonials);
     } catch (error) {
       toast({
         title: "Error loading data",
@@ -0,0 +1,46 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other by bare name, as when run from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "clock(*modules, start=...): patch the fake clock into these modules' `time`"
+    )
+
+
+class FakeClock:
+    """Stands in for a module's ``time``: time() and monotonic() only move when advanced"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """A FakeClock replacing ``time`` in the modules named by the test's clock marker.
+
+    Only those modules see it, so the event loop keeps the real clock.
+    """
+    marker = request.node.get_closest_marker("clock")
+    clock = FakeClock(marker.kwargs.get("start", 1_000_000.0))
+    for module in marker.args:
+        monkeypatch.setattr(module, "time", clock)
+    return clock
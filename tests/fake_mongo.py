@@ -0,0 +1,76 @@
+"""A small in-memory stand-in for the Motor collection methods the backend uses"""
+import copy
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+def matches(doc, query):
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            for operator, operand in condition.items():
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$lt" and not (value is not None and value < operand):
+                    return False
+                if operator == "$lte" and not (value is not None and value <= operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def apply_update(doc, update, inserting=False):
+    for field, value in update.get("$set", {}).items():
+        doc[field] = copy.deepcopy(value)
+    if inserting:
+        for field, value in update.get("$setOnInsert", {}).items():
+            doc[field] = copy.deepcopy(value)
+    for field, amount in update.get("$inc", {}).items():
+        doc[field] = doc.get(field, 0) + amount
+    for field in update.get("$unset", {}):
+        doc.pop(field, None)
+
+
+class FakeCollection:
+    def __init__(self, unique_field="_id"):
+        self.unique_field = unique_field
+        self.docs = []
+
+    def find_doc(self, query):
+        return next((doc for doc in self.docs if matches(doc, query)), None)
+
+    async def insert_one(self, doc):
+        if any(existing.get(self.unique_field) == doc.get(self.unique_field) for existing in self.docs):
+            raise DuplicateKeyError("duplicate key")
+        self.docs.append(copy.deepcopy(doc))
+
+    async def find_one(self, query):
+        return copy.deepcopy(self.find_doc(query))
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.find_doc(query)
+        if doc is None:
+            if upsert:
+                doc = {key: value for key, value in query.items() if not isinstance(value, dict)}
+                apply_update(doc, update, inserting=True)
+                await self.insert_one(doc)
+            return
+        apply_update(doc, update)
+
+    async def find_one_and_update(self, query, update, sort=None, return_document=ReturnDocument.BEFORE):
+        candidates = [doc for doc in self.docs if matches(doc, query)]
+        for field, direction in reversed(sort or []):
+            candidates.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        if not candidates:
+            return None
+        doc = candidates[0]
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        return copy.deepcopy(doc) if return_document == ReturnDocument.AFTER else before
+
+    async def delete_one(self, query):
+        doc = self.find_doc(query)
+        if doc is not None:
+            self.docs.remove(doc)
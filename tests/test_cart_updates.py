@@ -0,0 +1,155 @@
+import pytest
+
+from cart_updates import (
+    InvalidCartOperation, add_item_stage, batch_update, remove_item_stage, set_quantity_stage, touch_stage,
+)
+from models import CartOperation
+
+
+def evaluate(expression, variables):
+    """Evaluate the aggregation expressions the cart pipelines use"""
+    if isinstance(expression, str):
+        if expression.startswith("$$"):
+            name, _, path = expression[2:].partition(".")
+            value = variables[name]
+            return value.get(path) if path else value
+        if expression.startswith("$"):
+            return variables["ROOT"].get(expression[1:])
+        return expression
+    if isinstance(expression, list):
+        return [evaluate(item, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) != 1 or not next(iter(expression)).startswith("$"):
+        return {key: evaluate(value, variables) for key, value in expression.items()}
+
+    operator, args = next(iter(expression.items()))
+    if operator == "$literal":
+        return args
+    if operator in ("$map", "$filter"):
+        name = args["as"]
+        items = evaluate(args["input"], variables)
+        if operator == "$map":
+            return [evaluate(args["in"], {**variables, name: item}) for item in items]
+        return [item for item in items if evaluate(args["cond"], {**variables, name: item})]
+    values = [evaluate(arg, variables) for arg in args]
+    if operator == "$cond":
+        return values[1] if values[0] else values[2]
+    if operator == "$ifNull":
+        return values[0] if values[0] is not None else values[1]
+    if operator == "$in":
+        return values[0] in values[1]
+    if operator == "$eq":
+        return values[0] == values[1]
+    if operator == "$ne":
+        return values[0] != values[1]
+    if operator == "$add":
+        return sum(values)
+    if operator == "$concatArrays":
+        return [item for value in values for item in value]
+    if operator == "$mergeObjects":
+        return {key: value for part in values for key, value in part.items()}
+    raise NotImplementedError(operator)
+
+
+def apply(stages, doc=None):
+    doc = dict(doc or {})
+    for stage in stages:
+        for field, expression in stage["$set"].items():
+            doc[field] = evaluate(expression, {"ROOT": doc})
+    return doc
+
+
+def items(*pairs):
+    return [{"product_id": product_id, "quantity": quantity, "price_at_time": 99} for product_id, quantity in pairs]
+
+
+def operation(op, product_id, quantity=1):
+    return CartOperation(op=op, product_id=product_id, quantity=quantity)
+
+
+def test_add_appends_a_new_item_and_increments_an_existing_one():
+    cart = apply([add_item_stage("prod-1", 2, 99)])
+    assert cart["items"] == items(("prod-1", 2))
+    cart = apply([add_item_stage("prod-1", 1, 99), add_item_stage("prod-2", 1, 99)], cart)
+    assert cart["items"] == items(("prod-1", 3), ("prod-2", 1))
+
+
+def test_set_quantity_changes_only_that_item():
+    cart = {"items": items(("prod-1", 1), ("prod-2", 1))}
+    assert apply([set_quantity_stage("prod-2", 4)], cart)["items"] == items(("prod-1", 1), ("prod-2", 4))
+    assert apply([set_quantity_stage("prod-3", 4)], cart)["items"] == cart["items"]
+
+
+def test_set_quantity_to_zero_removes_the_item():
+    assert set_quantity_stage("prod-1", 0) == remove_item_stage("prod-1")
+    cart = {"items": items(("prod-1", 1), ("prod-2", 1))}
+    assert apply([set_quantity_stage("prod-1", 0)], cart)["items"] == items(("prod-2", 1))
+
+
+def test_remove_on_a_cart_without_items():
+    assert apply([remove_item_stage("prod-1")])["items"] == []
+
+
+def test_product_ids_are_literals_not_field_paths():
+    stages = [add_item_stage("$session_id", 1, 99), set_quantity_stage("$$ROOT", 2), remove_item_stage("$items")]
+    for stage in stages:
+        assert "'$literal'" in repr(stage)
+    cart = apply([add_item_stage("$session_id", 1, 99)], {"session_id": "s1"})
+    assert cart["items"][0]["product_id"] == "$session_id"
+
+
+def test_touch_fills_in_defaults_only_for_a_new_cart():
+    new = apply([touch_stage()])
+    assert new["items"] == [] and new["id"] and new["created_at"] == new["updated_at"]
+    existing = {"id": "cart-1", "items": items(("prod-1", 1)), "created_at": "then", "updated_at": "then"}
+    touched = apply([touch_stage()], existing)
+    assert (touched["id"], touched["items"], touched["created_at"]) == ("cart-1", existing["items"], "then")
+    assert touched["updated_at"] != "then"
+
+
+def test_batch_applies_operations_in_order():
+    stages, required, upsert = batch_update(
+        [operation("add", "prod-1"), operation("update", "prod-1", 5), operation("add", "prod-2")],
+        {"prod-1": 99, "prod-2": 99}
+    )
+    assert (required, upsert) == ([], True)
+    # The touch stage always runs last
+    assert "updated_at" in stages[-1]["$set"]
+    assert apply(stages)["items"] == items(("prod-1", 5), ("prod-2", 1))
+
+
+def test_updates_to_untouched_items_must_be_in_the_stored_cart():
+    _, required, upsert = batch_update(
+        [operation("update", "prod-1", 2), operation("update", "prod-1", 3), operation("remove", "prod-2")], {}
+    )
+    assert required == ["prod-1"]
+    assert upsert is False
+
+
+def test_update_after_an_add_needs_nothing_stored():
+    _, required, _ = batch_update([operation("add", "prod-1"), operation("update", "prod-1", 3)], {"prod-1": 99})
+    assert required == []
+
+
+@pytest.mark.parametrize("operations", [
+    [operation("remove", "prod-1"), operation("update", "prod-1", 2)],
+    [operation("update", "prod-1", 0), operation("update", "prod-1", 2)],
+])
+def test_update_after_the_batch_removed_the_item_is_a_404(operations):
+    with pytest.raises(InvalidCartOperation) as error:
+        batch_update(operations, {})
+    assert error.value.status_code == 404
+
+
+def test_adding_a_non_positive_quantity_is_rejected():
+    with pytest.raises(InvalidCartOperation) as error:
+        batch_update([operation("add", "prod-1", 0)], {"prod-1": 99})
+    assert error.value.status_code == 400
+
+
+def test_only_a_batch_with_an_add_creates_the_cart():
+    assert batch_update([operation("remove", "prod-1")], {})[2] is False
+    assert batch_update([operation("remove", "prod-1"), operation("add", "prod-2")], {"prod-2": 99})[2] is True
+    # An add cannot create a cart that must already hold another item
+    assert batch_update([operation("update", "prod-1", 2), operation("add", "prod-2")], {"prod-2": 99})[2] is False
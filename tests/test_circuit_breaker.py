@@ -0,0 +1,104 @@
+import asyncio
+
+import httpx
+import pytest
+
+import razorpay_gateway
+from razorpay_gateway import CircuitBreaker, CircuitOpenError, GatewayError, RazorpayGateway
+
+pytestmark = pytest.mark.clock(razorpay_gateway, start=100.0)
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(29)
+    assert not breaker.allow()
+    clock.advance(1)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only the one trial call goes through
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_half_open_trial_reopens_on_failure(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    clock.advance(30)
+    assert breaker.allow()
+
+
+class HangingClient:
+    """httpx client stand-in whose requests never finish"""
+
+    async def request(self, method, path, **kwargs):
+        await asyncio.Event().wait()
+
+
+class FailingClient:
+    async def request(self, method, path, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+
+def gateway_with(client, breaker):
+    gateway = RazorpayGateway("key", "secret", breaker=breaker)
+    gateway._client = client
+    return gateway
+
+
+def test_gateway_short_circuits_once_open(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    gateway = gateway_with(FailingClient(), breaker)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(GatewayError):
+                await gateway.create_order({})
+        with pytest.raises(CircuitOpenError):
+            await gateway.create_order({})
+
+    asyncio.run(scenario())
+    assert breaker.state == "open"
+
+
+def test_cancelled_half_open_trial_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.advance(30)
+    gateway = gateway_with(HangingClient(), breaker)
+
+    async def scenario():
+        # The caller gives up on the trial call
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(gateway.create_order({}), timeout=0.01)
+
+    asyncio.run(scenario())
+    assert breaker.state == "open"
+    clock.advance(30)
+    assert breaker.allow()
@@ -0,0 +1,177 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import email_outbox
+from email_outbox import EmailOutbox
+from tests.fake_mongo import FakeCollection
+
+
+class NoJitter:
+    @staticmethod
+    def uniform(low, high):
+        return 1.0
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(email_outbox, "random", NoJitter)
+
+
+class Handler:
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.payloads = []
+
+    async def __call__(self, payload):
+        self.payloads.append(payload)
+        result = self.results.pop(0) if self.results else True
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def make_outbox(handler=None, **options):
+    return EmailOutbox(FakeCollection(unique_field="id"), {"order_confirmation": handler or Handler()}, **options)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def job(outbox, job_id):
+    return outbox.collection.find_doc({"id": job_id})
+
+
+def test_enqueue_stores_a_dedupe_key_once():
+    outbox = make_outbox()
+    run(outbox.enqueue("order_confirmation", {"order_number": "A"}, dedupe_key="confirm:A"))
+    run(outbox.enqueue("order_confirmation", {"order_number": "A2"}, dedupe_key="confirm:A"))
+    assert len(outbox.collection.docs) == 1
+    assert job(outbox, "confirm:A")["payload"] == {"order_number": "A"}
+
+
+def test_claim_leases_the_oldest_due_job():
+    outbox = make_outbox(lock_timeout=300)
+
+    async def scenario():
+        await outbox.enqueue("order_confirmation", {}, dedupe_key="first")
+        await outbox.enqueue("order_confirmation", {}, dedupe_key="second")
+        job(outbox, "second")["next_attempt_at"] -= timedelta(seconds=10)
+        job(outbox, "first")["next_attempt_at"] += timedelta(hours=1)
+        return await outbox._claim(), await outbox._claim()
+
+    claimed, nothing_due = run(scenario())
+    assert claimed["id"] == "second"
+    assert claimed["status"] == "sending" and claimed["attempts"] == 1
+    assert claimed["next_attempt_at"] - claimed["updated_at"] == timedelta(seconds=300)
+    assert nothing_due is None
+
+
+def test_expired_lease_is_claimed_again():
+    outbox = make_outbox()
+
+    async def scenario():
+        await outbox.enqueue("order_confirmation", {}, dedupe_key="a")
+        await outbox._claim()
+        # The worker holding it died; its lease ran out
+        job(outbox, "a")["next_attempt_at"] = datetime.utcnow() - timedelta(seconds=1)
+        return await outbox._claim()
+
+    assert run(scenario())["attempts"] == 2
+
+
+def test_sent_job_is_marked_sent():
+    handler = Handler()
+    outbox = make_outbox(handler)
+
+    async def scenario():
+        await outbox.enqueue("order_confirmation", {"order_number": "A"}, dedupe_key="a")
+        await outbox._process(await outbox._claim())
+
+    run(scenario())
+    assert handler.payloads == [{"order_number": "A"}]
+    assert job(outbox, "a")["status"] == "sent"
+
+
+@pytest.mark.parametrize("result", [False, RuntimeError("SMTP down")])
+def test_failed_send_is_retried_with_exponential_backoff(result):
+    outbox = make_outbox(Handler([result] * 3), base_delay=5, max_delay=3600, max_attempts=8)
+
+    async def attempt():
+        claimed = await outbox._claim()
+        await outbox._process(claimed)
+        stored = job(outbox, "a")
+        delay = stored["next_attempt_at"] - stored["updated_at"]
+        # Make the retry due now
+        stored["next_attempt_at"] = datetime.utcnow() - timedelta(seconds=1)
+        return stored["status"], delay
+
+    async def scenario():
+        await outbox.enqueue("order_confirmation", {}, dedupe_key="a")
+        return [await attempt() for _ in range(3)]
+
+    assert run(scenario()) == [
+        ("pending", timedelta(seconds=5)),
+        ("pending", timedelta(seconds=10)),
+        ("pending", timedelta(seconds=20)),
+    ]
+    assert job(outbox, "a")["last_error"]
+
+
+def test_backoff_is_capped():
+    outbox = make_outbox(Handler([False]), base_delay=5, max_delay=60, max_attempts=20)
+
+    async def scenario():
+        await outbox.enqueue("order_confirmation", {}, dedupe_key="a")
+        job(outbox, "a")["attempts"] = 9
+        await outbox._process(await outbox._claim())
+
+    run(scenario())
+    stored = job(outbox, "a")
+    assert stored["next_attempt_at"] - stored["updated_at"] == timedelta(seconds=60)
+
+
+def test_job_fails_permanently_after_max_attempts():
+    outbox = make_outbox(Handler([False, False]), max_attempts=2)
+
+    async def scenario():
+        await outbox.enqueue("order_confirmation", {}, dedupe_key="a")
+        for _ in range(2):
+            await outbox._process(await outbox._claim())
+            job(outbox, "a")["next_attempt_at"] = datetime.utcnow() - timedelta(seconds=1)
+        return await outbox._claim()
+
+    assert run(scenario()) is None
+    assert job(outbox, "a")["status"] == "failed"
+    assert job(outbox, "a")["attempts"] == 2
+
+
+def test_unknown_kind_is_retried_not_dropped():
+    outbox = make_outbox()
+
+    async def scenario():
+        await outbox.enqueue("newsletter", {}, dedupe_key="a")
+        await outbox._process(await outbox._claim())
+
+    run(scenario())
+    assert job(outbox, "a")["status"] == "pending"
+
+
+def test_workers_send_queued_jobs_and_stop():
+    handler = Handler()
+    outbox = make_outbox(handler, workers=2, poll_interval=0.01)
+
+    async def scenario():
+        outbox.start()
+        await outbox.enqueue("order_confirmation", {"order_number": "A"}, dedupe_key="a")
+        for _ in range(100):
+            if job(outbox, "a")["status"] == "sent":
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(outbox.stop(), timeout=1)
+
+    run(scenario())
+    assert job(outbox, "a")["status"] == "sent"
+    assert handler.payloads == [{"order_number": "A"}]
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic import BaseModel
+
+from idempotency import IdempotencyConflict, IdempotencyStore, idempotent, request_fingerprint
+from tests.fake_mongo import FakeCollection
+
+
+class Payload(BaseModel):
+    amount: int
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def store():
+    return IdempotencyStore(FakeCollection(), lock_timeout=60)
+
+
+def test_completed_request_is_replayed(store):
+    fingerprint = request_fingerprint(Payload(amount=1))
+    assert run(store.begin("orders", "k1", fingerprint)) is None
+    run(store.complete("orders", "k1", 200, {"id": "a"}))
+    assert run(store.begin("orders", "k1", fingerprint)) == {"status_code": 200, "body": {"id": "a"}}
+
+    # Another worker without the cached copy reads it from the collection
+    other = IdempotencyStore(store.collection)
+    assert run(other.begin("orders", "k1", fingerprint))["body"] == {"id": "a"}
+
+
+def test_key_reused_for_a_different_request_conflicts(store):
+    run(store.begin("orders", "k1", request_fingerprint(Payload(amount=1))))
+    with pytest.raises(IdempotencyConflict) as error:
+        run(store.begin("orders", "k1", request_fingerprint(Payload(amount=2))))
+    assert error.value.status_code == 422
+
+
+def test_scopes_do_not_share_keys(store):
+    fingerprint = request_fingerprint(Payload(amount=1))
+    run(store.begin("orders", "k1", fingerprint))
+    assert run(store.begin("checkout", "k1", fingerprint)) is None
+
+
+def test_in_flight_request_conflicts_until_its_lock_expires(store):
+    fingerprint = request_fingerprint(Payload(amount=1))
+    run(store.begin("orders", "k1", fingerprint))
+    with pytest.raises(IdempotencyConflict) as error:
+        run(store.begin("orders", "k1", fingerprint))
+    assert error.value.status_code == 409
+
+    # The first request died without completing; a retry takes the claim over
+    store.collection.find_doc({"_id": "orders:k1"})["locked_until"] = datetime.utcnow() - timedelta(seconds=1)
+    assert run(store.begin("orders", "k1", fingerprint)) is None
+    assert store.collection.find_doc({"_id": "orders:k1"})["locked_until"] > datetime.utcnow()
+    with pytest.raises(IdempotencyConflict):
+        run(store.begin("orders", "k1", fingerprint))
+
+
+def test_release_lets_the_client_retry(store):
+    fingerprint = request_fingerprint(Payload(amount=1))
+    run(store.begin("orders", "k1", fingerprint))
+    run(store.release("orders", "k1"))
+    assert run(store.begin("orders", "k1", fingerprint)) is None
+
+
+def test_decorator_releases_the_claim_when_the_handler_fails(store):
+    calls = []
+
+    @idempotent(store, "orders")
+    async def handler(payload: Payload, idempotency_key=None):
+        calls.append(payload.amount)
+        if len(calls) == 1:
+            raise RuntimeError("gateway down")
+        return {"amount": payload.amount}
+
+    with pytest.raises(RuntimeError):
+        run(handler(payload=Payload(amount=5), idempotency_key="k1"))
+    assert run(handler(payload=Payload(amount=5), idempotency_key="k1")) == {"amount": 5}
+    replay = run(handler(payload=Payload(amount=5), idempotency_key="k1"))
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert calls == [5, 5]
+
+
+def test_decorator_returns_the_response_when_storing_it_fails(store):
+    async def failing_complete(*args, **kwargs):
+        raise RuntimeError("database unavailable")
+    store.complete = failing_complete
+
+    @idempotent(store, "orders")
+    async def handler(payload: Payload, idempotency_key=None):
+        return {"amount": payload.amount}
+
+    assert run(handler(payload=Payload(amount=5), idempotency_key="k1")) == {"amount": 5}
@@ -0,0 +1,86 @@
+import pytest
+
+import order_numbers
+from order_numbers import (
+    ALPHABET, EPOCH_MS, MAX_SEQUENCE, MAX_WORKER_ID, SEQUENCE_BITS, WORKER_ID_BITS,
+    OrderNumberGenerator, configured_worker_id, encode,
+)
+
+START = (EPOCH_MS + 1_000_000) / 1000
+
+pytestmark = pytest.mark.clock(order_numbers, start=START)
+
+
+def decode(order_number, prefix="ORD-"):
+    value = 0
+    for char in order_number[len(prefix):]:
+        value = value * 32 + ALPHABET.index(char)
+    return value >> (WORKER_ID_BITS + SEQUENCE_BITS), (value >> SEQUENCE_BITS) & MAX_WORKER_ID, value & MAX_SEQUENCE
+
+
+def test_encode_is_fixed_width_and_ordered():
+    assert encode(0) == "0" * 13
+    assert len(encode((1 << 63) - 1)) == 13
+    assert encode(31) < encode(32) < encode(1 << 40)
+
+
+def test_numbers_sort_in_creation_order(clock):
+    generator = OrderNumberGenerator(7)
+    numbers = []
+    for _ in range(5):
+        numbers.append(generator.next())
+        numbers.append(generator.next())
+        clock.advance(0.003)
+    assert numbers == sorted(numbers)
+    assert len(set(numbers)) == len(numbers)
+    assert decode(numbers[0]) == (1_000_000, 7, 0)
+    assert decode(numbers[1]) == (1_000_000, 7, 1)
+
+
+def test_sequence_rollover_borrows_the_next_millisecond(clock):
+    generator = OrderNumberGenerator(1)
+    numbers = [generator.next() for _ in range(MAX_SEQUENCE + 2)]
+    assert numbers == sorted(numbers)
+    assert len(set(numbers)) == len(numbers)
+    assert decode(numbers[MAX_SEQUENCE]) == (1_000_000, 1, MAX_SEQUENCE)
+    assert decode(numbers[-1]) == (1_000_001, 1, 0)
+
+
+def test_clock_going_backwards_keeps_numbers_increasing(clock):
+    generator = OrderNumberGenerator(1)
+    first = generator.next()
+    clock.advance(-5)
+    second = generator.next()
+    assert second > first
+    assert decode(second) == (1_000_000, 1, 1)
+
+
+def test_worker_ids_keep_numbers_apart(clock):
+    assert OrderNumberGenerator(1).next() != OrderNumberGenerator(2).next()
+
+
+@pytest.mark.parametrize("worker_id", [-1, MAX_WORKER_ID + 1])
+def test_out_of_range_worker_id_is_rejected(worker_id):
+    with pytest.raises(ValueError):
+        OrderNumberGenerator(worker_id)
+
+
+def test_generator_refuses_without_a_valid_worker_id(clock):
+    with pytest.raises(RuntimeError):
+        OrderNumberGenerator().next()
+    generator = OrderNumberGenerator()
+    generator.assign(3, valid_until=clock.now - 1)
+    with pytest.raises(RuntimeError):
+        generator.next()
+    generator.assign(3, valid_until=clock.now + 60)
+    assert decode(generator.next())[1] == 3
+
+
+def test_configured_worker_id(monkeypatch):
+    monkeypatch.delenv("ORDER_WORKER_ID", raising=False)
+    assert configured_worker_id() is None
+    monkeypatch.setenv("ORDER_WORKER_ID", "12")
+    assert configured_worker_id() == 12
+    monkeypatch.setenv("ORDER_WORKER_ID", str(MAX_WORKER_ID + 1))
+    with pytest.raises(ValueError):
+        configured_worker_id()
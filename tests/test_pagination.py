@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter, keyset_sort
+
+
+def test_cursor_round_trips():
+    doc = {"_id": ObjectId(), "created_at": datetime(2025, 3, 1, 10, 30, 15, 123000)}
+    cursor = encode_cursor(doc)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (doc["created_at"], doc["_id"])
+
+
+def test_cursor_on_another_sort_field():
+    doc = {"_id": ObjectId(), "updated_at": datetime(2025, 3, 1)}
+    assert decode_cursor(encode_cursor(doc, "updated_at")) == (doc["updated_at"], doc["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "e30", "eyJ0IjogIngiLCAiaWQiOiAieSJ9"])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_keyset_filter_without_cursor_returns_the_query():
+    query = {"status": "new"}
+    assert keyset_filter(query, None) is query
+
+
+def test_keyset_filter_continues_after_the_cursor():
+    object_id = ObjectId()
+    created_at = datetime(2025, 3, 1)
+    cursor = encode_cursor({"_id": object_id, "created_at": created_at})
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": object_id}}
+    ]}
+    assert keyset_filter({}, cursor) == after
+    assert keyset_filter({"status": "new"}, cursor) == {"$and": [{"status": "new"}, after]}
+
+
+def test_keyset_sort_matches_the_filter_direction():
+    assert keyset_sort() == [("created_at", -1), ("_id", -1)]
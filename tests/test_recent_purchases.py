@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from recent_purchases import MOCK_PURCHASES, RecentPurchases
+
+NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def order(number, minutes_ago, title="Software System Design"):
+    return {
+        "order_number": number,
+        "customer_name": f"Customer {number}",
+        "city": "Pune",
+        "items": [{"product_title": title}],
+        "created_at": NOW - timedelta(minutes=minutes_ago)
+    }
+
+
+def numbers(purchases):
+    """Order numbers of the real purchases shown, in display order"""
+    return [
+        purchase["customerName"].removeprefix("Customer ")
+        for purchase in purchases.snapshot() if purchase not in MOCK_PURCHASES
+    ]
+
+
+def test_seed_keeps_the_newest_orders_newest_first():
+    purchases = RecentPurchases(size=3)
+    purchases.seed([order("A", 30), order("B", 10), order("C", 50), order("D", 20)])
+    assert numbers(purchases) == ["B", "D", "A"]
+
+
+def test_record_inserts_by_creation_time_and_drops_the_oldest():
+    purchases = RecentPurchases(size=3)
+    purchases.seed([order("A", 30), order("B", 10), order("C", 50)])
+    assert purchases.record(order("D", 20)) is not None
+    assert numbers(purchases) == ["B", "D", "A"]
+    # Older than everything in a full buffer
+    assert purchases.record(order("E", 90)) is None
+    assert numbers(purchases) == ["B", "D", "A"]
+
+
+def test_duplicates_and_orders_without_items_are_ignored():
+    purchases = RecentPurchases(size=5)
+    purchases.record(order("A", 5))
+    assert purchases.record(order("A", 5)) is None
+    assert purchases.record({**order("B", 1), "items": []}) is None
+    assert numbers(purchases) == ["A"]
+
+
+def test_snapshot_pads_with_mock_purchases():
+    purchases = RecentPurchases(size=3)
+    purchases.record(order("A", 5, title="Clean Code"))
+    snapshot = purchases.snapshot()
+    assert len(snapshot) == 3
+    assert snapshot[0]["productName"] == "Clean Code"
+    assert snapshot[1:] == MOCK_PURCHASES[:2]
+
+
+def test_snapshot_is_rebuilt_after_a_new_purchase():
+    purchases = RecentPurchases(size=2)
+    purchases.record(order("A", 5, title="First"))
+    assert purchases.snapshot()[0]["productName"] == "First"
+    purchases.record(order("B", 1, title="Second"))
+    assert [entry["productName"] for entry in purchases.snapshot()] == ["Second", "First"]
+
+
+def test_reseed_publishes_only_purchases_not_seen_before():
+    async def scenario():
+        purchases = RecentPurchases(size=5)
+        purchases.seed([order("A", 30)])
+        queue = purchases.subscribe()
+        purchases.seed([order("A", 30), order("B", 10), order("C", 20)])
+        events = []
+        while not queue.empty():
+            events.append(queue.get_nowait())
+        purchases.unsubscribe(queue)
+        return events
+
+    events = asyncio.run(scenario())
+    assert len(events) == 2
+    assert b"Customer C" in events[0] and b"Customer B" in events[1]
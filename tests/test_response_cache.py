@@ -0,0 +1,67 @@
+import gzip
+import json
+
+import brotli
+
+from response_cache import MIN_COMPRESS_SIZE, CachedBody, ComposedBody, parse_accept_encoding, serialize_json
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding(None) == set()
+    assert parse_accept_encoding("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert parse_accept_encoding("GZIP;q=0.5, br;q=0, identity") == {"gzip", "identity"}
+    assert parse_accept_encoding("gzip;q=abc, *") == {"*"}
+    assert parse_accept_encoding(" , ;q=1") == set()
+
+
+def test_small_bodies_are_not_compressed():
+    body = CachedBody(b'{"a":1}')
+    assert body.variants == {}
+    assert body.select("gzip, br") == (None, b'{"a":1}')
+
+
+def test_select_prefers_accepted_compressed_variant():
+    identity = serialize_json([{"title": "Software System Design"}] * 50)
+    assert len(identity) >= MIN_COMPRESS_SIZE
+    body = CachedBody(identity)
+
+    encoding, data = body.select("gzip")
+    assert encoding == "gzip"
+    assert gzip.decompress(data) == identity
+    assert body.select("identity") == (None, identity)
+    assert body.select("gzip;q=0")[0] is None
+    assert body.select("gzip, br")[0] == "br"
+    assert body.select("*")[0] == "br"
+
+
+def test_matches_any_representation_of_the_same_body():
+    body = CachedBody(serialize_json({"a": 1}))
+    assert body.matches(body.etag())
+    assert body.matches(body.etag("gzip"))
+    assert body.matches(f'"other", W/{body.etag("br")}')
+    assert body.matches("*")
+    assert not body.matches(None)
+    assert not body.matches(CachedBody(serialize_json({"a": 2})).etag())
+
+
+def test_composed_body_reuses_cached_members():
+    products = [{"id": "prod-1", "title": "Software System Design"}] * 20
+    cached = CachedBody(serialize_json(products))
+    body = ComposedBody({"products": cached, "cart": {"items": []}})
+
+    assert cached.identity in body.identity
+    assert json.loads(body.identity) == {"products": products, "cart": {"items": []}}
+    assert body.digest == ComposedBody({"products": cached, "cart": {"items": []}}).digest
+    assert body.digest != ComposedBody({"products": cached, "cart": {"items": [1]}}).digest
+
+
+def test_composed_body_compresses_only_the_chosen_encoding():
+    body = ComposedBody({"products": [{"title": "Software System Design"}] * 50})
+
+    assert body.encoding_for("gzip") == "gzip"
+    assert body.encoding_for("gzip, br") == "br"
+    assert body.encoding_for("identity") is None
+    assert gzip.decompress(body.content("gzip")) == body.identity
+    assert brotli.decompress(body.content("br")) == body.identity
+    assert body.variants == {}
+    assert ComposedBody({"a": 1}).encoding_for("br") is None
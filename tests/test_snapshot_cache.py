@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import snapshot_cache
+from snapshot_cache import SnapshotCache
+
+pytestmark = pytest.mark.clock(snapshot_cache)
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        return self.calls
+
+
+async def settle():
+    # Let the background rebuild run
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_first_read_loads_and_later_reads_reuse(clock):
+    async def scenario():
+        loader = Loader()
+        cache = SnapshotCache("test", loader, ttl=60)
+        first = await cache.get()
+        second = await cache.get()
+        return loader.calls, first.version, second is first
+
+    assert asyncio.run(scenario()) == (1, 1, True)
+
+
+def test_first_load_failure_is_raised(clock):
+    async def scenario():
+        loader = Loader()
+        loader.fail = True
+        await SnapshotCache("test", loader, ttl=60).get()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def test_expired_snapshot_is_served_while_it_rebuilds(clock):
+    async def scenario():
+        loader = Loader()
+        cache = SnapshotCache("test", loader, ttl=60)
+        await cache.get()
+        clock.advance(61)
+        stale = await cache.get()
+        also_stale = await cache.get()
+        await settle()
+        fresh = await cache.get()
+        return stale.data, also_stale.data, fresh.data, loader.calls
+
+    assert asyncio.run(scenario()) == (1, 1, 2, 2)
+
+
+def test_failed_rebuild_keeps_the_old_snapshot(clock):
+    async def scenario():
+        loader = Loader()
+        cache = SnapshotCache("test", loader, ttl=60)
+        await cache.get()
+        clock.advance(61)
+        loader.fail = True
+        await cache.get()
+        await settle()
+        kept = await cache.get()
+        await settle()
+        loader.fail = False
+        await cache.get()
+        await settle()
+        recovered = await cache.get()
+        return kept.version, recovered.version
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_refresh_rebuilds_immediately(clock):
+    async def scenario():
+        cache = SnapshotCache("test", Loader(), ttl=60)
+        await cache.get()
+        await cache.refresh()
+        return (await cache.get()).version
+
+    assert asyncio.run(scenario()) == 2